@@ -3,18 +3,30 @@ import secrets
 from flask import Flask
 from flask_cors import CORS
 
+import metrics
+import profiler
+
 def create_app():
     app = Flask(__name__)
-    CORS(app)
+    CORS(app, expose_headers=['Server-Timing', 'X-Profile-Id'])
 
     app.secret_key = os.getenv('SECRET_KEY', secrets.token_hex(16))
 
     from routes import main_bp
 
     app.register_blueprint(main_bp)
+    metrics.init_app(app)
+    profiler.init_app(app)
 
     return app
 
 if __name__ == '__main__':
+    # Development server; serve production with `gunicorn -c gunicorn.conf.py wsgi:app`
+    import lifecycle
+
     app = create_app()
-    app.run(port=7654, debug=True)
+    lifecycle.start_worker()
+    try:
+        app.run(port=7654, debug=True)
+    finally:
+        lifecycle.shutdown()
@@ -0,0 +1,116 @@
+import json
+import struct
+
+import numpy as np
+from flask import Response, jsonify
+
+BINARY_MIMETYPE = 'application/octet-stream'
+
+
+def parse_max_points(value):
+    """max_points from a request: None for no limit, otherwise an integer of at least 2."""
+    if value is None:
+        return None
+    try:
+        max_points = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'max_points must be an integer, got {value!r}')
+    if max_points < 2:
+        raise ValueError('max_points must be at least 2')
+    return max_points
+
+
+def downsample_indices(values, max_points):
+    """
+    Pick at most `max_points` indices of `values`, keeping the minimum and
+    maximum of each bucket so peaks survive the reduction.
+    """
+    values = np.asarray(values, dtype=float)
+    n = values.size
+    if not max_points or n <= max_points:
+        return np.arange(n)
+
+    num_buckets = max((int(max_points) - 2) // 2, 1)
+    edges = np.linspace(0, n, num_buckets + 1).astype(int)
+    filled = np.where(np.isnan(values), -np.inf, values)
+    emptied = np.where(np.isnan(values), np.inf, values)
+
+    buckets = list(zip(edges[:-1], edges[1:]))
+    argmax = [start + np.argmax(filled[start:stop]) for start, stop in buckets]
+    argmin = [start + np.argmin(emptied[start:stop]) for start, stop in buckets]
+
+    return np.unique(np.concatenate([argmin, argmax, [0, n - 1]])).astype(int)
+
+
+def downsample_record(record, array_keys, reference_key, max_points):
+    """Downsample every array in `array_keys` with the indices chosen on reference_key."""
+    reference = record.get(reference_key)
+    if reference is None or not max_points:
+        return record
+
+    indices = downsample_indices(reference, max_points)
+    reduced = dict(record)
+    for key in array_keys:
+        if reduced.get(key) is not None:
+            reduced[key] = np.asarray(reduced[key], dtype=float)[indices]
+    return reduced
+
+
+def _json_floats(values):
+    return [float(v) if np.isfinite(v) else None for v in np.asarray(values, dtype=float)]
+
+
+def _json_value(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+def encode_records(records, array_keys, fmt='json', extra=None, key='records'):
+    """
+    Encode a list of per-spectrum records as a response.
+
+    fmt='json' returns arrays as lists (NaN -> null). fmt='binary' returns a
+    little-endian uint32 header length, a JSON header describing each record
+    with [offset, length] pointers, padding to 4 bytes, then one float32
+    buffer holding every array back to back.
+    """
+    extra = extra or {}
+
+    if fmt == 'json':
+        encoded = []
+        for record in records:
+            item = {}
+            for name, value in record.items():
+                if name in array_keys and value is not None:
+                    item[name] = _json_floats(value)
+                else:
+                    item[name] = _json_value(value)
+            encoded.append(item)
+        return jsonify({'success': True, **extra, key: encoded})
+
+    if fmt != 'binary':
+        raise ValueError(f"Unsupported payload format: {fmt}")
+
+    chunks = []
+    offset = 0
+    header_records = []
+    for record in records:
+        item = {'arrays': {}}
+        for name, value in record.items():
+            if name in array_keys and value is not None:
+                array = np.asarray(value, dtype='<f4')
+                chunks.append(array.tobytes())
+                item['arrays'][name] = [offset, int(array.size)]
+                offset += int(array.size)
+            else:
+                item[name] = _json_value(value)
+        header_records.append(item)
+
+    header = json.dumps({**extra, 'dtype': 'float32', key: header_records}).encode('utf-8')
+    padding = b' ' * (-(len(header) + 4) % 4)
+    body = struct.pack('<I', len(header) + len(padding)) + header + padding + b''.join(chunks)
+
+    return Response(body, mimetype=BINARY_MIMETYPE)
@@ -0,0 +1,118 @@
+import os
+import re
+import time
+import uuid
+import threading
+
+_NAMESPACE_RE = re.compile(r'^[0-9a-f]{32}$')
+
+# Top-level artifact directories, each split into one sub-directory per namespace
+SAVED_DATA = 'saved_data'
+IMAGES = os.path.join('static', 'images')
+ORIGIN = 'origin'
+CSV_EXPORTS = os.path.join('exports', 'csv_files')
+PROFILES = 'profiles'  # shared only, never namespaced
+ARTIFACT_KINDS = (SAVED_DATA, IMAGES, ORIGIN, CSV_EXPORTS, PROFILES)
+
+# Liveness is also written to a marker file so every server worker sees it
+LIVE_MARKER = '.last_used'
+LIVE_MARKER_INTERVAL = 60  # seconds between marker updates for one namespace
+
+_last_used = {}  # namespace -> time a request last resolved it
+_marked = {}  # namespace -> time its marker was last updated
+_last_used_lock = threading.Lock()
+
+
+def new_namespace():
+    return uuid.uuid4().hex
+
+
+def is_namespace(value):
+    return isinstance(value, str) and bool(_NAMESPACE_RE.match(value))
+
+
+def artifact_dir(kind, namespace=None, create=True):
+    """
+    Absolute directory for one kind of artifact (SAVED_DATA, IMAGES, ...).
+
+    With namespace=None this is the shared, pre-namespace location.
+    """
+    if namespace is not None and not is_namespace(namespace):
+        raise ValueError(f"Invalid artifact namespace: {namespace!r}")
+
+    directory = os.path.join(os.getcwd(), kind)
+    if namespace is not None:
+        directory = os.path.join(directory, namespace)
+    if create:
+        os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def namespace_of(path):
+    """The namespace a saved artifact lives in, or None for shared / foreign paths."""
+    if not path:
+        return None
+    namespace = os.path.basename(os.path.dirname(os.path.abspath(path)))
+    return namespace if is_namespace(namespace) else None
+
+
+def touch(namespace):
+    """Mark a namespace as in use; the storage sweeper leaves live namespaces alone."""
+    now = time.time()
+    with _last_used_lock:
+        _last_used[namespace] = now
+        if now - _marked.get(namespace, 0) < LIVE_MARKER_INTERVAL:
+            return
+        _marked[namespace] = now
+
+    marker = os.path.join(artifact_dir(SAVED_DATA, namespace), LIVE_MARKER)
+    try:
+        with open(marker, 'a'):
+            os.utime(marker, None)
+    except OSError:
+        pass  # liveness is advisory
+
+
+def live_namespaces(ttl):
+    """Namespaces resolved by a request, in any server worker, within the last `ttl` seconds."""
+    cutoff = time.time() - ttl
+    with _last_used_lock:
+        for namespace in [ns for ns, used in _last_used.items() if used < cutoff]:
+            del _last_used[namespace]
+        live = set(_last_used)
+
+    root = artifact_dir(SAVED_DATA, create=False)
+    if os.path.isdir(root):
+        for namespace in os.listdir(root):
+            try:
+                if is_namespace(namespace) and os.path.getmtime(os.path.join(root, namespace, LIVE_MARKER)) >= cutoff:
+                    live.add(namespace)
+            except OSError:
+                continue
+    return live
+
+
+def session_namespace():
+    """This client's namespace, created on first use and kept in the Flask session."""
+    from flask import session
+
+    namespace = session.get('artifact_namespace')
+    if not is_namespace(namespace):
+        namespace = new_namespace()
+        session['artifact_namespace'] = namespace
+    touch(namespace)
+    return namespace
+
+
+def request_namespace(dataset_path=None):
+    """
+    Namespace for artifacts derived from `dataset_path`.
+
+    Derived data stays next to the dataset it came from, so a client that
+    only sends paths back (no session cookie) keeps a consistent namespace.
+    """
+    namespace = namespace_of(dataset_path)
+    if namespace is None:
+        return session_namespace()
+    touch(namespace)
+    return namespace
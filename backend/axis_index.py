@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+
+class AxisIndex:
+    """
+    Range lookups on a spectrum axis (energy-loss index or angle/q columns).
+
+    Monotonic axes are resolved with searchsorted into a contiguous slice, so
+    selecting a window never copies the data. Unsorted axes (or axes holding
+    NaN) fall back to a boolean mask.
+    """
+
+    def __init__(self, values):
+        if isinstance(values, pd.Index):
+            if not pd.api.types.is_numeric_dtype(values):
+                values = values.astype(float)
+            increasing = values.is_monotonic_increasing
+            decreasing = values.is_monotonic_decreasing
+        else:
+            increasing = decreasing = None
+
+        self.values = np.asarray(values, dtype=float)
+
+        if increasing is None:
+            diffs = np.diff(self.values)
+            increasing = bool(np.all(diffs >= 0))
+            decreasing = bool(np.all(diffs <= 0))
+
+        if np.isnan(self.values).any():
+            increasing = decreasing = False
+
+        self.increasing = increasing
+        self.decreasing = decreasing and not increasing
+
+    @property
+    def is_sorted(self):
+        return self.increasing or self.decreasing
+
+    def locate(self, lo=None, hi=None):
+        """Return a slice (sorted axis) or boolean mask selecting lo <= v <= hi."""
+        if lo is None and hi is None:
+            return slice(None)
+
+        if self.increasing:
+            start = 0 if lo is None else np.searchsorted(self.values, lo, side='left')
+            stop = len(self.values) if hi is None else np.searchsorted(self.values, hi, side='right')
+            return slice(int(start), int(max(start, stop)))
+
+        if self.decreasing:
+            # searchsorted needs ascending input; search the negated axis
+            negated = -self.values
+            start = 0 if hi is None else np.searchsorted(negated, -hi, side='left')
+            stop = len(self.values) if lo is None else np.searchsorted(negated, -lo, side='right')
+            return slice(int(start), int(max(start, stop)))
+
+        mask = np.ones(len(self.values), dtype=bool)
+        if lo is not None:
+            mask &= self.values >= lo
+        if hi is not None:
+            mask &= self.values <= hi
+        return mask
+
+
+def slice_dataframe_by_range(df, x_min=None, x_max=None, y_min=None, y_max=None):
+    """
+    Select the columns within [x_min, x_max] and rows within [y_min, y_max].
+
+    Bounds left as None are open. On sorted axes the result is a positional
+    slice of the original frame rather than a masked copy.
+    """
+    rows, cols = range_indexers(df, x_min, x_max, y_min, y_max)
+    return df.iloc[rows, cols]
+
+
+def range_indexers(df, x_min=None, x_max=None, y_min=None, y_max=None):
+    """(rows, cols) positional indexers of slice_dataframe_by_range, for slicing arrays aligned with df."""
+    rows = AxisIndex(df.index).locate(y_min, y_max)
+    cols = AxisIndex(df.columns).locate(x_min, x_max)
+    return rows, cols
+
+
+def slice_array(values, rows, cols):
+    """Apply (rows, cols) from range_indexers to a 2D array aligned with the frame."""
+    if isinstance(rows, slice) and isinstance(cols, slice):
+        return values[rows, cols]  # a view
+    rows = np.arange(values.shape[0])[rows]
+    cols = np.arange(values.shape[1])[cols]
+    return values[np.ix_(rows, cols)]
@@ -0,0 +1,233 @@
+"""
+Benchmark the processing pipeline on synthetic EELS stacks.
+
+    python benchmark.py --scale small --scale medium --repeat 5 --output bench.json
+    python benchmark.py --compare bench.json           # rerun and compare against an earlier run
+
+Every benchmark is timed `repeat` times, starting from cleared in-process
+caches (the first run is reported separately as the cold run). The caches
+are then cleared again and one more run under tracemalloc gives the peak
+allocation of that cold path. Runs happen in a scratch directory, so
+artifacts never land in the working tree.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+
+os.environ.setdefault('MPLBACKEND', 'Agg')
+os.environ.setdefault('RENDER_WORKERS', '0')
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BACKEND_DIR)
+
+from synthetic_spectra import synthetic_stack, write_stack  # noqa: E402
+
+SCALES = {
+    'small': {'count': 4, 'n_energy': 150, 'n_angle': 100},
+    'medium': {'count': 8, 'n_energy': 300, 'n_angle': 200},
+    'large': {'count': 16, 'n_energy': 600, 'n_angle': 400},
+}
+TRANSFORM_ACTIONS = ('flip_ud', 'flip_lr', 'rotate_ccw90', 'rotate_cw90', 'blur', 'sharpen')
+
+
+def _benchmarks(scale, workdir):
+    """(name, params, callable, teardown) for every benchmark at one scale."""
+    import matplotlib.pyplot as plt
+    import side_writer
+    from file_processor import load_and_store_data
+    from plotter import shift_and_preview, plot_data_with_q_conversion
+    from transformer import transform_data
+    from q_converter import angle_to_q, angles_to_q, process_q_values
+    from profile_analyzer import fit_and_plot_profiles
+
+    paths = sorted(write_stack(os.path.join(workdir, 'input'), **scale))
+    explist, exptitles = synthetic_stack(**scale)
+    gauss_y = [float(df.index[np.argmax(df.to_numpy().sum(axis=1))]) for df in explist]
+    angles = explist[0].columns.to_numpy(dtype=float) * np.pi / 180
+
+    def q_axis_scalar():
+        return np.array([angle_to_q(angle, gauss_y[0], 0) for angle in angles])
+
+    q_axis = q_axis_scalar()
+
+    benchmarks = [
+        ('load_and_store_data', {}, lambda: load_and_store_data(paths), None),
+        ('shift_and_preview', {}, lambda: shift_and_preview(explist, exptitles, plot=False), side_writer.flush),
+    ]
+    benchmarks += [('transform_data', {'action': action}, lambda action=action: transform_data(explist, action), None)
+                   for action in TRANSFORM_ACTIONS]
+    benchmarks += [
+        ('angle_to_q', {'points': len(angles)}, q_axis_scalar, None),
+        ('angles_to_q', {'points': len(angles)}, lambda: angles_to_q(angles, gauss_y[0], 0.0), None),
+        ('process_q_values', {'points': len(q_axis)}, lambda: process_q_values(q_axis), None),
+    ]
+    benchmarks += [('fit_and_plot_profiles', {'profile_axis': axis},
+                    lambda axis=axis: fit_and_plot_profiles(explist, exptitles, profile_axis=axis),
+                    lambda: plt.close('all'))
+                   for axis in ('x', 'y')]
+    benchmarks += [('plot_data_with_q_conversion', {'q_conversion': q_conversion},
+                    lambda q_conversion=q_conversion: plot_data_with_q_conversion(
+                        explist, exptitles, gauss_y=gauss_y, q_conversion=q_conversion, apply_log=True),
+                    lambda: plt.close('all'))
+                   for q_conversion in (False, True)]
+    return benchmarks
+
+
+def clear_caches():
+    """Drop every in-process cache the pipeline fills, so the next run takes the cold path."""
+    import plotter
+    import raster
+    import derived_arrays
+    import integral_image
+    import q_converter
+    import regridder
+
+    derived_arrays.clear_derived_cache()
+    integral_image.clear_integral_cache()
+    q_converter.clear_q_cache()
+    regridder.clear_weights_cache()
+    raster.colormap_lut.cache_clear()
+    with plotter._grid_renderers_lock:
+        plotter._grid_renderers.clear()
+
+
+def measure(func, repeat, teardown=None):
+    """Wall times of `repeat` runs from cold caches, then the tracemalloc peak of one more cold run."""
+    clear_caches()
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+        if teardown is not None:
+            teardown()
+
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    clear_caches()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    func()
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    if not tracing:
+        tracemalloc.stop()
+    if teardown is not None:
+        teardown()
+
+    warm = times[1:] or times
+    return {
+        'cold': times[0],
+        'min': min(warm),
+        'median': statistics.median(warm),
+        'mean': statistics.fmean(warm),
+        'times': times,
+        'peak_memory_bytes': peak,
+        'peak_memory_path': 'cold',
+    }
+
+
+def _environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': time.time(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+
+
+def run(scales, repeat, only=None):
+    """Benchmark results for the named scales, as a JSON-serializable dict."""
+    results = []
+    original_cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix='spectroscopex-bench-')
+    try:
+        os.chdir(workdir)  # artifact directories resolve against the cwd
+        for scale_name in scales:
+            scale = SCALES[scale_name]
+            for name, params, func, teardown in _benchmarks(scale, workdir):
+                if only and name not in only:
+                    continue
+                result = measure(func, repeat, teardown)
+                results.append({'scale': scale_name, 'benchmark': name, 'params': params, **scale, **result})
+                print(f"{scale_name:>6} {name:<28} {json.dumps(params):<28} "
+                      f"median {result['median'] * 1000:9.2f} ms  cold {result['cold'] * 1000:9.2f} ms  "
+                      f"peak ({result['peak_memory_path']}) {result['peak_memory_bytes'] / 1e6:8.2f} MB", flush=True)
+    finally:
+        os.chdir(original_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {'environment': _environment(), 'repeat': repeat, 'results': results}
+
+
+def _result_key(result):
+    return result['scale'], result['benchmark'], json.dumps(result['params'], sort_keys=True)
+
+
+def compare(baseline, current):
+    """Per-benchmark median time and peak memory ratios, current / baseline."""
+    previous = {_result_key(result): result for result in baseline['results']}
+    rows = []
+    for result in current['results']:
+        old = previous.get(_result_key(result))
+        if old is None:
+            continue
+        rows.append({
+            'scale': result['scale'],
+            'benchmark': result['benchmark'],
+            'params': result['params'],
+            'time_ratio': result['median'] / old['median'] if old['median'] else None,
+            # Results from before peak_memory_path existed measured the warm path
+            'memory_ratio': (result['peak_memory_bytes'] / old['peak_memory_bytes']
+                             if old['peak_memory_bytes'] and old.get('peak_memory_path') == result['peak_memory_path']
+                             else None),
+        })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', action='append', choices=sorted(SCALES),
+                        help='scale to run (repeatable; default small and medium)')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per benchmark')
+    parser.add_argument('--only', action='append', help='run only this benchmark (repeatable)')
+    parser.add_argument('--output', default='benchmark_results.json', help='where to write the JSON results')
+    parser.add_argument('--compare', help='earlier results JSON to compare against')
+    args = parser.parse_args(argv)
+
+    results = run(args.scale or ['small', 'medium'], max(1, args.repeat), args.only)
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            results['comparison'] = compare(json.load(f), results)
+        for row in results['comparison']:
+            time_ratio = f"{row['time_ratio']:.2f}x" if row['time_ratio'] is not None else 'n/a'
+            memory_ratio = f"{row['memory_ratio']:.2f}x" if row['memory_ratio'] is not None else 'n/a'
+            print(f"{row['scale']:>6} {row['benchmark']:<28} {json.dumps(row['params']):<28} "
+                  f"time {time_ratio:>7}  memory {memory_ratio:>7}")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
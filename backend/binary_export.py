@@ -0,0 +1,98 @@
+import io
+import json
+import logging
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+    pq = None
+
+MIMETYPES = {'npz': 'application/octet-stream', 'parquet': 'application/vnd.apache.parquet'}
+PARQUET_METADATA_KEY = b'spectroscopex'
+
+
+def parquet_available():
+    return pq is not None
+
+
+def _padded(arrays, shape):
+    """Stack 1D/2D float arrays into one NaN-padded array of `shape`."""
+    stacked = np.full(shape, np.nan)
+    for i, values in enumerate(arrays):
+        stacked[(i,) + tuple(slice(0, n) for n in values.shape)] = values
+    return stacked
+
+
+def stack_cube(explist):
+    """
+    (cube, energy_loss, x, shapes) for an explist.
+
+    cube is (spectra, energy_loss, x). When every spectrum shares its axes
+    they are stored once as 1D arrays; otherwise they are (spectra, n)
+    arrays and spectra of different sizes are NaN-padded, with `shapes`
+    giving each spectrum's real size.
+    """
+    shapes = np.array([df.shape for df in explist], dtype=np.int64)
+    first = explist[0]
+    shared_axes = all(df.index.equals(first.index) and df.columns.equals(first.columns) for df in explist[1:])
+
+    if shared_axes:
+        cube = np.stack([df.to_numpy(dtype=np.float64) for df in explist])
+        return cube, first.index.to_numpy(dtype=np.float64), first.columns.to_numpy(dtype=np.float64), shapes
+
+    rows, cols = shapes.max(axis=0)
+    cube = _padded([df.to_numpy(dtype=np.float64) for df in explist], (len(explist), rows, cols))
+    energy_loss = _padded([df.index.to_numpy(dtype=np.float64) for df in explist], (len(explist), rows))
+    x = _padded([df.columns.to_numpy(dtype=np.float64) for df in explist], (len(explist), cols))
+    return cube, energy_loss, x, shapes
+
+
+def to_npz(explist, exptitles, info, compressed=False):
+    """
+    The explist as an .npz: `intensity` cube, `energy_loss` and `x` axes,
+    `shapes`, `titles`, and `metadata` holding provenance JSON (metadata and
+    processing history). Loads with np.load and no pickle.
+    """
+    cube, energy_loss, x, shapes = stack_cube(explist)
+    buffer = io.BytesIO()
+    save = np.savez_compressed if compressed else np.savez
+    save(buffer, intensity=cube, energy_loss=energy_loss, x=x, shapes=shapes,
+         titles=np.array(exptitles, dtype=str), metadata=np.array(json.dumps(info, default=str)))
+    buffer.seek(0)
+    return buffer
+
+
+def to_parquet(explist, exptitles, info, compression='zstd'):
+    """
+    The explist as a long-format Parquet table (title, energy_loss, x,
+    intensity), with provenance JSON in the schema metadata.
+    """
+    if not parquet_available():
+        raise RuntimeError("Parquet export requires pyarrow")
+
+    titles, energy_loss, x, intensity = [], [], [], []
+    for index, (df, title) in enumerate(zip(explist, exptitles)):
+        values = df.to_numpy(dtype=np.float64)
+        rows, cols = values.shape
+        titles.append(np.full(rows * cols, index, dtype=np.int32))
+        energy_loss.append(np.repeat(df.index.to_numpy(dtype=np.float64), cols))
+        x.append(np.tile(df.columns.to_numpy(dtype=np.float64), rows))
+        intensity.append(values.ravel())
+
+    table = pa.table({
+        'title': pa.DictionaryArray.from_arrays(np.concatenate(titles), pa.array(list(exptitles), pa.string())),
+        'energy_loss': np.concatenate(energy_loss),
+        'x': np.concatenate(x),
+        'intensity': np.concatenate(intensity),
+    })
+    table = table.replace_schema_metadata({PARQUET_METADATA_KEY: json.dumps(info, default=str).encode('utf-8')})
+
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, compression=compression)
+    buffer.seek(0)
+    logging.debug(f"Parquet export: {table.num_rows} rows, {buffer.getbuffer().nbytes} bytes")
+    return buffer
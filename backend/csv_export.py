@@ -0,0 +1,116 @@
+import io
+import os
+import zipfile
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from axis_index import range_indexers
+
+EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', min(4, os.cpu_count() or 1)))
+ZIP_CHUNK_SIZE = 1024 * 1024
+
+
+def format_csv(df, x_min=None, x_max=None, y_min=None, y_max=None, header=True, index=True,
+               index_label='Loss Energy (eV)', float_format=None, sep=','):
+    """One spectrum as CSV bytes, cropped to the given angle/q (columns) and energy (rows) range."""
+    if any(bound is not None for bound in (x_min, x_max, y_min, y_max)):
+        rows, cols = range_indexers(df, x_min, x_max, y_min, y_max)
+        df = df.iloc[rows, cols]
+
+    return df.to_csv(header=header, index=index, index_label=index_label if index else None,
+                     float_format=float_format, sep=sep).encode('utf-8')
+
+
+def check_csv_options(explist, x_min=None, x_max=None, y_min=None, y_max=None, header=True,
+                      float_format=None, sep=',', **_):
+    """
+    Raise ValueError for options format_csv would reject.
+
+    stream_zip formats spectra after the response has started, when an error
+    can only truncate the archive, so everything is checked up front.
+    """
+    if not isinstance(sep, str) or len(sep) != 1:
+        raise ValueError('sep must be a single character')
+    if float_format is not None:
+        try:
+            float_format % 1.0
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid float_format: {float_format!r}')
+
+    cropped = any(bound is not None for bound in (x_min, x_max, y_min, y_max))
+    for i, df in enumerate(explist):
+        columns = df.columns
+        if cropped:
+            try:
+                columns = columns[range_indexers(df, x_min, x_max, y_min, y_max)[1]]
+            except (TypeError, ValueError):
+                raise ValueError('x_min, x_max, y_min and y_max must be numbers')
+        if isinstance(header, list) and len(header) != len(columns):
+            raise ValueError(f'header has {len(header)} names but spectrum {i} has {len(columns)} columns '
+                             f'in the exported range')
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, unseekable file object that hands written bytes to the response generator."""
+
+    def __init__(self):
+        self._chunks = deque()
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        while self._chunks:
+            yield self._chunks.popleft()
+
+
+def stream_zip(explist, exptitles, compress_level=6, workers=None, **csv_options):
+    """
+    Yield a ZIP archive of one CSV per spectrum, chunk by chunk.
+
+    CSVs are formatted in worker threads, at most 2 x workers ahead of the
+    writer, and each one is deflated into the stream as soon as it is ready,
+    so neither the archive nor all CSVs are ever held in memory at once.
+    """
+    workers = workers or EXPORT_WORKERS
+    sink = _ChunkSink()
+    compression = zipfile.ZIP_DEFLATED if compress_level > 0 else zipfile.ZIP_STORED
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='csv-export') as executor:
+        jobs = iter(zip(explist, exptitles))
+        pending = deque()
+
+        def fill():
+            while len(pending) < 2 * workers:
+                job = next(jobs, None)
+                if job is None:
+                    return
+                df, title = job
+                pending.append((title, executor.submit(format_csv, df, **csv_options)))
+
+        with zipfile.ZipFile(sink, 'w', compression=compression,
+                             compresslevel=compress_level if compression == zipfile.ZIP_DEFLATED else None) as archive:
+            fill()
+            while pending:
+                title, future = pending.popleft()
+                data = future.result()
+                fill()
+
+                with archive.open(f"{title}.csv", 'w', force_zip64=True) as entry:
+                    for start in range(0, len(data), ZIP_CHUNK_SIZE):
+                        entry.write(data[start:start + ZIP_CHUNK_SIZE])
+                        yield from sink.drain()
+                yield from sink.drain()
+                logging.debug(f"Streamed {title}.csv ({len(data)} bytes)")
+
+        yield from sink.drain()  # central directory
@@ -0,0 +1,143 @@
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+import shared_datasets
+import metrics
+from utils import save_dataframe_to_file, load_dataframe_from_file
+
+DATASET_STORE_MAX_BYTES = int(os.getenv('DATASET_STORE_MAX_BYTES', 1024 * 1024 * 1024))
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # dataset id -> entry dict, least recently used first
+_resident_bytes = 0
+_counters = {'hits': 0, 'misses': 0, 'shared_maps': 0, 'evictions': 0}
+
+
+def dataset_id(path):
+    """Datasets are identified by the absolute path of their on-disk pickle."""
+    return os.path.abspath(path)
+
+
+def _nbytes(data):
+    if isinstance(data, pd.DataFrame):
+        return int(data.memory_usage(index=True).sum()) + data.columns.nbytes
+    if isinstance(data, dict):
+        return sum(_nbytes(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return sum(_nbytes(value) for value in data)
+    return 0
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def _evict():
+    global _resident_bytes
+    while _resident_bytes > DATASET_STORE_MAX_BYTES and len(_entries) > 1:
+        _, entry = _entries.popitem(last=False)
+        _resident_bytes -= entry['nbytes']
+        _counters['evictions'] += 1
+
+
+def put(path, data, shared=False):
+    """
+    Keep `data`, already saved at `path`, resident under its dataset id.
+
+    Evicting an entry only drops it from memory; the file is the source of
+    truth. shared=True marks data backed by a memory map that all server
+    workers share; it does not count against the budget.
+    """
+    global _resident_bytes
+
+    key = dataset_id(path)
+    entry = {'data': data, 'nbytes': 0 if shared else _nbytes(data), 'mtime': _mtime(key)}
+    with _lock:
+        old = _entries.pop(key, None)
+        if old is not None:
+            _resident_bytes -= old['nbytes']
+        _entries[key] = entry
+        _resident_bytes += entry['nbytes']
+        _evict()
+
+
+def get(path):
+    """Resident data for `path`, or None. Entries whose file changed on disk are dropped."""
+    global _resident_bytes
+
+    key = dataset_id(path)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return None
+        if entry['mtime'] != _mtime(key):
+            # Rewritten behind the store's back (another server worker, a manual edit)
+            del _entries[key]
+            _resident_bytes -= entry['nbytes']
+            return None
+        _entries.move_to_end(key)
+        return entry['data']
+
+
+def _keep_shared(path, data):
+    """Publish `data` for the other server workers and keep the memory-mapped copy resident."""
+    if shared_datasets.publish(path, data):
+        shared = shared_datasets.open_shared(path)
+        if shared is not None:
+            put(path, shared, shared=True)
+            return
+    put(path, data)
+
+
+def load(path):
+    """load_dataframe_from_file through the store: memory, then a shared memory map, then disk."""
+    data = get(path)
+    if data is not None:
+        with _lock:
+            _counters['hits'] += 1
+        return data
+
+    with _lock:
+        _counters['misses'] += 1
+    data = shared_datasets.open_shared(path)
+    if data is not None:
+        with _lock:
+            _counters['shared_maps'] += 1
+        put(path, data, shared=True)
+        return data
+
+    with metrics.stage('unpickle_dataset') as timing:
+        data = load_dataframe_from_file(path)
+        if data is not None:
+            timing.add(spectra=len(data) if isinstance(data, list) else 0, nbytes=os.path.getsize(path))
+    if data is not None:
+        _keep_shared(path, data)
+    return data
+
+
+def save(data, filename, namespace=None):
+    """save_dataframe_to_file, keeping the saved data resident. Returns the file path."""
+    with metrics.stage('pickle_dataset') as timing:
+        file_path = save_dataframe_to_file(data, filename, namespace=namespace)
+        if file_path is not None:
+            timing.add(spectra=len(data) if isinstance(data, list) else 0, nbytes=os.path.getsize(file_path))
+    if file_path is not None:
+        _keep_shared(file_path, data)
+    return file_path
+
+
+def resident_ids():
+    with _lock:
+        return set(_entries)
+
+
+def stats():
+    with _lock:
+        return {'entries': len(_entries), 'resident_bytes': _resident_bytes,
+                'max_bytes': DATASET_STORE_MAX_BYTES, 'shared': shared_datasets.SHARED_DATASETS, **_counters}
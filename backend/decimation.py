@@ -0,0 +1,55 @@
+import math
+import warnings
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+
+def display_dpi(dpi=None):
+    """The DPI savefig will actually use when none is passed explicitly."""
+    if dpi is not None:
+        return dpi
+    dpi = plt.rcParams['savefig.dpi']
+    return plt.rcParams['figure.dpi'] if dpi == 'figure' else dpi
+
+
+def block_reduce(Z, target_shape, method='max'):
+    """
+    Shrink Z to at most target_shape (rows, cols) by aggregating blocks.
+
+    'max' keeps narrow peaks visible; 'mean' gives a smoother image. Edges
+    that do not divide evenly are NaN-padded so no data is dropped.
+    """
+    Z = np.asarray(Z)
+    rows, cols = Z.shape
+    target_rows, target_cols = (max(int(n), 1) for n in target_shape)
+
+    row_factor = math.ceil(rows / target_rows)
+    col_factor = math.ceil(cols / target_cols)
+    if row_factor <= 1 and col_factor <= 1:
+        return Z
+
+    out_rows = math.ceil(rows / row_factor)
+    out_cols = math.ceil(cols / col_factor)
+
+    padded = np.full((out_rows * row_factor, out_cols * col_factor), np.nan)
+    padded[:rows, :cols] = Z
+    blocks = padded.reshape(out_rows, row_factor, out_cols, col_factor)
+
+    if method == 'max':
+        reduce = np.nanmax
+    elif method == 'mean':
+        reduce = np.nanmean
+    else:
+        raise ValueError("Decimation method must be 'max' or 'mean'")
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)  # all-NaN blocks
+        return reduce(blocks, axis=(1, 3))
+
+
+def decimate_for_display(Z, size_inches, dpi=None, method='max'):
+    """Block-reduce Z to the pixel size of an axes `size_inches` (width, height) wide."""
+    dpi = display_dpi(dpi)
+    width, height = size_inches
+    return block_reduce(Z, (height * dpi, width * dpi), method=method)
@@ -0,0 +1,153 @@
+import os
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+from render_cache import spectrum_version
+
+DERIVED_CACHE_MAX_BYTES = int(os.getenv('DERIVED_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+_lock = threading.Lock()
+_derived = OrderedDict()  # spectrum version -> DerivedArrays, least recently used first
+_derived_bytes = 0
+_versions = {}  # id(df) -> spectrum version, dropped when the frame is collected
+
+
+def _read_only(values):
+    values = values.view()
+    values.flags.writeable = False
+    return values
+
+
+class DerivedArrays:
+    """
+    Lazily computed transforms of one spectrum's intensity matrix.
+
+    Every array handed out is read-only, so renderers share the cached copy
+    instead of taking their own.
+    """
+
+    def __init__(self, version, values):
+        self.version = version
+        self.values = _read_only(np.asarray(values))
+        self.numeric = np.issubdtype(self.values.dtype, np.number)
+        self._arrays = {}
+        self._stats = {}
+        self._lock = threading.RLock()  # normalized() computes log1p() under it
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + sum(array.nbytes for array in self._arrays.values())
+
+    def _array(self, name, compute):
+        with self._lock:
+            array = self._arrays.get(name)
+            if array is None:
+                array = _read_only(compute())
+                self._arrays[name] = array
+                _account(self, array.nbytes)
+            return array
+
+    def log1p(self):
+        return self._array('log1p', lambda: np.log1p(self.values))
+
+    def intensity(self, apply_log=True):
+        """The matrix as the renderers draw it: log1p-scaled when asked and numeric."""
+        return self.log1p() if apply_log and self.numeric else self.values
+
+    def min_max(self, apply_log=False):
+        """(min, max) over the finite values, or (nan, nan) if there are none."""
+        key = ('min_max', apply_log)
+        if key not in self._stats:
+            Z = self.intensity(apply_log)
+            finite = Z[np.isfinite(Z)]
+            self._stats[key] = (float(finite.min()), float(finite.max())) if finite.size else (np.nan, np.nan)
+        return self._stats[key]
+
+    def normalized(self, apply_log=False):
+        """The intensity rescaled to [0, 1] by its finite min and max."""
+        def compute():
+            lo, hi = self.min_max(apply_log)
+            scale = 1.0 / (hi - lo) if hi > lo else 0.0
+            return (self.intensity(apply_log) - lo) * scale
+
+        return self._array(('normalized', apply_log), compute)
+
+
+def _account(derived, nbytes):
+    global _derived_bytes
+    with _lock:
+        if _derived.get(derived.version) is derived:  # not evicted while computing
+            _derived_bytes += nbytes
+            _evict()
+
+
+def _evict():
+    global _derived_bytes
+    while _derived_bytes > DERIVED_CACHE_MAX_BYTES and len(_derived) > 1:
+        _, evicted = _derived.popitem(last=False)
+        _derived_bytes -= evicted.nbytes
+
+
+def version_of(df):
+    """Content version of a spectrum, hashed once per DataFrame object."""
+    key = id(df)
+    version = _versions.get(key)
+    if version is None:
+        version = spectrum_version(df)
+        _versions[key] = version
+        weakref.finalize(df, _versions.pop, key, None)
+    return version
+
+
+def derived_for(df):
+    """
+    Return the shared DerivedArrays of a spectrum.
+
+    Entries are keyed by content version, so reloading the same data reuses
+    them and changed data gets fresh ones. Frames edited in place must be
+    passed to invalidate() first.
+    """
+    global _derived_bytes
+
+    version = version_of(df)
+    with _lock:
+        derived = _derived.get(version)
+        if derived is not None:
+            _derived.move_to_end(version)
+            return derived
+
+        derived = DerivedArrays(version, df.values)
+        _derived[version] = derived
+        _derived_bytes += derived.nbytes
+        _evict()
+    logging.debug(f"Derived arrays created for spectrum {version}, shape {derived.values.shape}")
+
+    return derived
+
+
+def invalidate(df):
+    """Forget the cached version (and derived arrays) of a frame modified in place."""
+    global _derived_bytes
+
+    version = _versions.pop(id(df), None)
+    with _lock:
+        derived = _derived.pop(version, None)
+        if derived is not None:
+            _derived_bytes -= derived.nbytes
+
+
+def clear_derived_cache():
+    global _derived_bytes
+
+    with _lock:
+        _derived.clear()
+        _derived_bytes = 0
+
+
+def stats():
+    with _lock:
+        return {'entries': len(_derived), 'bytes': _derived_bytes, 'max_bytes': DERIVED_CACHE_MAX_BYTES}
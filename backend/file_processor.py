@@ -5,6 +5,7 @@ import numpy as np
 import uuid
 import logging
 import pickle
+import metrics
 
 
 def get_sorted_files(file_paths):
@@ -101,49 +102,63 @@ def save_dataframe_to_file(df, file_path=None):
     return file_path
 
 
-def load_and_store_data(file_paths, add_str='Experiment ', add_str2=' K'):
-    explist = []
-    exptitles = []
-    file_info = []
+def _read_spectrum(path):
+    """Read one CSV/pickle spectrum with numeric axes, or return None."""
+    if not os.path.exists(path):
+        logging.error(f"File does not exist: {path}")
+        return None
 
-    for path in file_paths:
-        if not os.path.exists(path):
-            logging.error(f"File does not exist: {path}")
-            continue
-
-        if path.endswith('.csv'):
-            try:
-                df = pd.read_csv(path, index_col=0)
-                logging.debug(f"Successfully read {path}, size: {df.shape}")
-                
+    if path.endswith('.csv'):
+        try:
+            df = pd.read_csv(path, index_col=0)
+            logging.debug(f"Successfully read {path}, size: {df.shape}")
+            
+            df = ensure_numeric_index_and_columns(df)
+            logging.debug(f"Converted {path} to numeric index and columns successfully")
+        except Exception as e:
+            logging.error(f"Error reading {path}: {e}")
+            return None
+
+        return df
+
+    elif path.endswith('.pkl'):
+        try:
+            with open(path, 'rb') as file:
+                df = pickle.load(file)
+            logging.debug(f"Successfully read {path}, size: {df.shape}")
+            
+            if isinstance(df, pd.DataFrame):
                 df = ensure_numeric_index_and_columns(df)
                 logging.debug(f"Converted {path} to numeric index and columns successfully")
-            except Exception as e:
-                logging.error(f"Error reading {path}: {e}")
-                continue
+            else:
+                logging.error(f"{path} is not a DataFrame format")
+                return None
+        except Exception as e:
+            logging.error(f"Error reading {path}: {e}")
+            return None
 
-            file_info.append((path, df))
+        return df
 
-        elif path.endswith('.pkl'):
-            try:
-                with open(path, 'rb') as file:
-                    df = pickle.load(file)
-                logging.debug(f"Successfully read {path}, size: {df.shape}")
-                
-                if isinstance(df, pd.DataFrame):
-                    df = ensure_numeric_index_and_columns(df)
-                    logging.debug(f"Converted {path} to numeric index and columns successfully")
-                else:
-                    logging.error(f"{path} is not a DataFrame format")
-                    continue
-            except Exception as e:
-                logging.error(f"Error reading {path}: {e}")
-                continue
+    logging.warning(f"Unsupported file extension: {path}")
+    return None
 
-            file_info.append((path, df))
 
-        else:
-            logging.warning(f"Unsupported file extension: {path}")
+def load_and_store_data(file_paths, add_str='Experiment ', add_str2=' K', progress=None):
+    explist = []
+    exptitles = []
+    file_info = []
+
+    if progress is not None:
+        progress.set_total('files_parsed', len(file_paths))
+
+    with metrics.stage('parse_files') as timing:
+        for path in file_paths:
+            df = _read_spectrum(path)
+            if df is not None:
+                file_info.append((path, df))
+                timing.add(spectra=1, nbytes=os.path.getsize(path))
+            if progress is not None:
+                progress.advance('files_parsed')
 
     file_info.sort(key=lambda x: x[0])
 
@@ -0,0 +1,30 @@
+import os
+import multiprocessing
+
+# Datasets are published as memory-mapped files that every worker maps read-only
+os.environ.setdefault('SHARED_DATASETS', '1')
+# Session cookies must verify in every worker and across restarts, so SECRET_KEY must be set (wsgi.py checks)
+
+bind = os.getenv('BIND', '127.0.0.1:7654')
+workers = int(os.getenv('WEB_WORKERS', min(4, multiprocessing.cpu_count())))
+threads = int(os.getenv('WEB_THREADS', 4))
+worker_class = 'gthread'
+timeout = int(os.getenv('WEB_TIMEOUT', 300))  # uploads fit and render every spectrum in-request
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 60))
+keepalive = 5
+# Import the app (matplotlib, pandas, routes) once in the master and share those pages with the workers
+preload_app = os.getenv('WEB_PRELOAD', '1') == '1'
+
+# Each web worker gets its own render pool; split the CPUs between them
+os.environ.setdefault('RENDER_WORKERS', str(max(1, multiprocessing.cpu_count() // workers)))
+
+
+def post_fork(server, worker):
+    # Pools and threads never survive a fork, so start them in each worker
+    import lifecycle
+    lifecycle.start_worker()
+
+
+def worker_exit(server, worker):
+    import lifecycle
+    lifecycle.shutdown()
@@ -0,0 +1,69 @@
+import logging
+from io import BytesIO
+
+from PIL import Image
+
+import render_cache
+from raster import encode_image
+
+MIMETYPES = {'png': 'image/png', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+DEFAULT_QUALITY = 80
+DEFAULT_COMPRESS_LEVEL = 6  # what matplotlib's savefig writes
+
+
+def delivery_options(args, fmt=None):
+    """
+    Parse ?format=png|webp|jpeg&quality=1-95&compress_level=0-9 into (fmt, quality, compress_level).
+
+    `fmt` (e.g. from the requested file extension) is used when the query
+    does not name a format. Raises ValueError on unsupported values.
+    """
+    fmt = (args.get('format') or fmt or 'png').lower()
+    if fmt == 'jpg':
+        fmt = 'jpeg'
+    if fmt not in MIMETYPES:
+        raise ValueError(f"Unsupported image format: {fmt}")
+
+    quality = int(args.get('quality', DEFAULT_QUALITY))
+    compress_level = int(args.get('compress_level', DEFAULT_COMPRESS_LEVEL))
+    if not 1 <= quality <= 95:
+        raise ValueError("quality must be between 1 and 95")
+    if not 0 <= compress_level <= 9:
+        raise ValueError("compress_level must be between 0 and 9")
+
+    return fmt, quality, compress_level
+
+
+def variant_key(key, fmt='png', quality=DEFAULT_QUALITY, compress_level=DEFAULT_COMPRESS_LEVEL):
+    """Cache key of one encoding of a render; the stored PNG is its own variant."""
+    if fmt == 'png' and compress_level == DEFAULT_COMPRESS_LEVEL:
+        return key
+    if fmt == 'png':
+        return f"{key}-z{compress_level}"
+    return f"{key}-{fmt}-q{quality}"
+
+
+def get_variant(key, fmt='png', quality=DEFAULT_QUALITY, compress_level=DEFAULT_COMPRESS_LEVEL):
+    """
+    Return (variant key, encoded bytes) for a cached render, or (None, None) if
+    the render is not cached.
+
+    Re-encodings are derived from the stored PNG once and cached alongside it,
+    so the variant key doubles as a strong ETag.
+    """
+    vkey = variant_key(key, fmt, quality, compress_level)
+    data = render_cache.get(vkey, fmt)
+    if data is not None:
+        return vkey, data
+
+    source = render_cache.get(key)
+    if source is None:
+        return None, None
+
+    image = Image.open(BytesIO(source))
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    data = encode_image(image, fmt=fmt, quality=quality, compress_level=compress_level).getvalue()
+    render_cache.put(vkey, data, fmt)
+    logging.debug(f"Encoded {key} as {fmt} ({len(source)} -> {len(data)} bytes)")
+    return vkey, data
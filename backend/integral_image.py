@@ -0,0 +1,114 @@
+import logging
+import weakref
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+
+INTEGRAL_CACHE_SIZE = 512
+
+_integral_cache = OrderedDict()  # key -> (table, weakref to the frame or None)
+_lock = threading.Lock()
+# Keys of collected frames. Finalizers run wherever the garbage collector does, possibly while
+# this thread holds _lock, so they only queue the key and the next cache access drops the entry.
+_dead_frames = deque()
+
+
+class IntegralImage:
+    """
+    Summed-area table of a spectrum. Any rectangular window sum or mean is
+    four lookups, so a full line cut costs O(1) per output point no matter
+    how wide the window is. NaN entries are skipped, like DataFrame.mean.
+    """
+
+    def __init__(self, values):
+        values = np.asarray(values, dtype=float)
+        nan_mask = np.isnan(values)
+
+        self.shape = values.shape
+        self.sums = self._table(np.where(nan_mask, 0.0, values))
+        self.counts = self._table(~nan_mask) if nan_mask.any() else None
+
+    @staticmethod
+    def _table(values):
+        table = np.zeros((values.shape[0] + 1, values.shape[1] + 1), dtype=float)
+        np.cumsum(values, axis=0, out=table[1:, 1:])
+        np.cumsum(table[1:, 1:], axis=1, out=table[1:, 1:])
+        return table
+
+    @staticmethod
+    def _rect(table, r0, r1, c0, c1):
+        return table[r1, c1] - table[r0, c1] - table[r1, c0] + table[r0, c0]
+
+    def window_sum(self, r0, r1, c0, c1):
+        """Sum over rows [r0, r1) and columns [c0, c1)."""
+        return self._rect(self.sums, r0, r1, c0, c1)
+
+    def window_count(self, r0, r1, c0, c1):
+        if self.counts is None:
+            return (np.asarray(r1) - r0) * (np.asarray(c1) - c0)
+        return self._rect(self.counts, r0, r1, c0, c1)
+
+    def window_mean(self, r0, r1, c0, c1):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.window_sum(r0, r1, c0, c1) / self.window_count(r0, r1, c0, c1)
+
+    def column_window_mean(self, c0, c1, r0=0, r1=None):
+        """Mean over columns [c0, c1) for every row in [r0, r1)."""
+        r1 = self.shape[0] if r1 is None else r1
+        rows = np.arange(r0, r1)
+        return self.window_mean(rows, rows + 1, c0, c1)
+
+    def row_window_mean(self, r0, r1, c0=0, c1=None):
+        """Mean over rows [r0, r1) for every column in [c0, c1)."""
+        c1 = self.shape[1] if c1 is None else c1
+        cols = np.arange(c0, c1)
+        return self.window_mean(r0, r1, cols, cols + 1)
+
+
+def integral_image_for(df, key=None):
+    """
+    Return the cached IntegralImage of a spectrum.
+
+    Callers that reload the same data (e.g. from a saved explist path) should
+    pass a stable key; otherwise the table lives as long as the DataFrame.
+    """
+    if key is None:
+        key = ('frame', id(df))
+        track = True
+    else:
+        track = False
+
+    with _lock:
+        _drop_dead_frames()
+        entry = _integral_cache.get(key)
+        # An id can be reused once its frame is collected, so check the entry still belongs to df
+        if entry is not None and (entry[1] is None or entry[1]() is df):
+            _integral_cache.move_to_end(key)
+            return entry[0]
+
+    table = IntegralImage(df.values)
+    with _lock:
+        _integral_cache[key] = (table, weakref.ref(df) if track else None)
+        if len(_integral_cache) > INTEGRAL_CACHE_SIZE:
+            _integral_cache.popitem(last=False)
+    if track:
+        weakref.finalize(df, _dead_frames.append, key)
+    logging.debug(f"Built integral image for {key}, shape {table.shape}")
+
+    return table
+
+
+def _drop_dead_frames():
+    """Drop entries of collected frames. Called with _lock held."""
+    while _dead_frames:
+        key = _dead_frames.popleft()
+        entry = _integral_cache.get(key)
+        if entry is not None and entry[1] is not None and entry[1]() is None:
+            del _integral_cache[key]
+
+
+def clear_integral_cache():
+    with _lock:
+        _integral_cache.clear()
+        _dead_frames.clear()
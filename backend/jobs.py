@@ -0,0 +1,126 @@
+import os
+import time
+import uuid
+import logging
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+MAX_TRACKED_JOBS = 256
+
+_executor = None
+_jobs = OrderedDict()  # job id -> Job, oldest first
+_lock = threading.Lock()
+
+
+class Job:
+    """
+    A queued unit of background work and its progress.
+
+    The job function receives the Job as its `progress` argument and reports
+    through set_stage/set_total/advance; status readers get to_dict().
+    """
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = 'queued'
+        self.stage = None
+        self.progress = OrderedDict()  # counter name -> {'done', 'total'}
+        self.result = None
+        self.error = None
+        self.created = self.updated = time.time()
+
+    def _touch(self):
+        self.updated = time.time()
+
+    def set_stage(self, stage):
+        with _lock:
+            self.stage = stage
+            self._touch()
+        logging.debug(f"Job {self.id}: {stage}")
+
+    def set_total(self, name, total):
+        with _lock:
+            self.progress.setdefault(name, {'done': 0, 'total': None})['total'] = total
+            self._touch()
+
+    def advance(self, name, step=1):
+        with _lock:
+            self.progress.setdefault(name, {'done': 0, 'total': None})['done'] += step
+            self._touch()
+
+    def to_dict(self):
+        with _lock:
+            data = {
+                'job_id': self.id,
+                'kind': self.kind,
+                'status': self.status,
+                'stage': self.stage,
+                'progress': {name: dict(counter) for name, counter in self.progress.items()},
+                'created': self.created,
+                'updated': self.updated,
+            }
+            if self.status == 'done':
+                data['result'] = self.result
+            if self.error is not None:
+                data['error'] = self.error
+            return data
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(JOB_WORKERS, 1), thread_name_prefix='job')
+        return _executor
+
+
+def _run(job, func, args, kwargs):
+    with _lock:
+        job.status = 'running'
+        job._touch()
+    try:
+        result = func(*args, progress=job, **kwargs)
+        with _lock:
+            job.result = result
+            job.status = 'done'
+            job.stage = 'done'
+            job._touch()
+        logging.info(f"Job {job.id} ({job.kind}) finished in {job.updated - job.created:.2f}s")
+    except Exception as e:
+        logging.error(f"Job {job.id} ({job.kind}) failed: {str(e)}")
+        logging.error(traceback.format_exc())
+        with _lock:
+            job.error = str(e)
+            job.status = 'error'
+            job._touch()
+
+
+def submit(kind, func, *args, **kwargs):
+    """Queue func(*args, progress=job, **kwargs) on the job workers and return the Job at once."""
+    job = Job(kind)
+    with _lock:
+        _jobs[job.id] = job
+        # Forget the oldest finished jobs; running ones are always kept
+        finished = [job_id for job_id, tracked in _jobs.items() if tracked.status in ('done', 'error')]
+        for job_id in finished[:max(len(_jobs) - MAX_TRACKED_JOBS, 0)]:
+            del _jobs[job_id]
+
+    _get_executor().submit(_run, job, func, args, kwargs)
+    return job
+
+
+def get(job_id):
+    with _lock:
+        return _jobs.get(job_id)
+
+
+def shutdown(wait=True):
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,69 @@
+import os
+import time
+import logging
+import threading
+
+import jobs
+import render_pool
+import side_writer
+import storage_manager
+import artifacts
+
+SHUTDOWN_TIMEOUT = float(os.getenv('SHUTDOWN_TIMEOUT', 30))
+
+_started = time.time()
+_draining = threading.Event()
+_shutdown_lock = threading.Lock()
+_shut_down = False
+
+
+def start_worker():
+    """Start this server process's background machinery (one call per worker process)."""
+    render_pool.start()
+    storage_manager.start_sweeper()
+    logging.info(f"Worker {os.getpid()} started")
+
+
+def draining():
+    return _draining.is_set()
+
+
+def shutdown(timeout=None):
+    """
+    Stop taking new work and finish what is in flight: background jobs,
+    and queued side-output writes are all completed before the render pool
+    goes down. Safe to call more than once.
+    """
+    global _shut_down
+
+    timeout = SHUTDOWN_TIMEOUT if timeout is None else timeout
+    _draining.set()
+    with _shutdown_lock:
+        if _shut_down:
+            return
+        _shut_down = True
+
+        started = time.time()
+        storage_manager.stop_sweeper()
+        jobs.shutdown(wait=True)
+        if not side_writer.flush(timeout=max(0.0, timeout - (time.time() - started))):
+            logging.warning("Shutdown timed out with side-output writes still queued")
+        render_pool.shutdown(wait=True)
+        logging.info(f"Worker {os.getpid()} shut down in {time.time() - started:.2f}s")
+
+
+def health():
+    """Liveness: the process is up and answering."""
+    return {'status': 'ok', 'pid': os.getpid(), 'uptime': time.time() - _started}
+
+
+def readiness():
+    """(ready, checks): whether this worker should be sent traffic."""
+    checks = {'accepting': not draining()}
+    try:
+        directory = artifacts.artifact_dir(artifacts.SAVED_DATA)
+        checks['storage_writable'] = os.access(directory, os.W_OK)
+    except OSError:
+        checks['storage_writable'] = False
+    checks['side_output_backlog'] = side_writer.status()['pending'] < side_writer.SIDE_WRITER_QUEUE_SIZE
+    return all(checks.values()), checks
@@ -0,0 +1,246 @@
+import os
+import time
+import bisect
+import logging
+import threading
+import functools
+import contextvars
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not POSIX: no peak RSS gauge
+    resource = None
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+# tracemalloc slows allocation-heavy code down noticeably, so per-stage peak memory is opt-in.
+# Its peak is process-wide, so the per-stage gauge is only meaningful with one request thread
+# and RENDER_WORKERS=0 (e.g. gunicorn --threads 1); concurrent stages inflate each other's peaks.
+METRICS_TRACE_MEMORY = os.getenv('METRICS_TRACE_MEMORY', '0') == '1'
+PREFIX = 'spectroscopex'
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_lock = threading.Lock()
+_counters = {}  # (name, labels) -> value
+_gauges = {}  # (name, labels) -> value
+_histograms = {}  # (name, labels) -> (buckets, [bucket counts..., +Inf count, sum])
+_help = {}
+
+# Stages timed on the request's own thread, for the Server-Timing header
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+_memory_frames = threading.local()
+
+if METRICS_TRACE_MEMORY:
+    tracemalloc.start()
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def describe(name, kind, text):
+    _help[name] = (kind, text)
+
+
+def inc(name, value=1, **labels):
+    with _lock:
+        key = (name, _labels(labels))
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_max(name, value, **labels):
+    """Gauge that only ever goes up (peaks)."""
+    with _lock:
+        key = (name, _labels(labels))
+        _gauges[key] = max(_gauges.get(key, 0), value)
+
+
+def observe(name, value, buckets=DURATION_BUCKETS, **labels):
+    with _lock:
+        key = (name, _labels(labels))
+        if key not in _histograms:
+            _histograms[key] = (tuple(buckets), [0] * (len(buckets) + 2))
+        buckets, counts = _histograms[key]  # the first observation fixes a series' buckets
+        counts[bisect.bisect_left(buckets, value)] += 1
+        counts[-1] += value
+
+
+describe('stage_duration_seconds', 'histogram', 'Wall time per processing stage')
+describe('stage_errors_total', 'counter', 'Processing stages that raised')
+describe('stage_spectra_total', 'counter', 'Spectra processed per stage')
+describe('stage_bytes_total', 'counter', 'Bytes read or written per stage')
+describe('stage_peak_memory_bytes', 'gauge',
+         'Largest traced Python/numpy allocation peak seen per stage (single-threaded serving only)')
+describe('process_peak_rss_bytes', 'gauge', 'Peak resident set size of this process')
+describe('http_request_duration_seconds', 'histogram', 'Wall time per request')
+
+
+class Stage:
+    """Handle yielded by stage(); add() records spectra and bytes as they are processed."""
+
+    def __init__(self, name):
+        self.name = name
+        self.spectra = 0
+        self.nbytes = 0
+
+    def add(self, spectra=0, nbytes=0):
+        self.spectra += spectra
+        self.nbytes += nbytes
+
+
+def _memory_enter():
+    # reset_peak() is process-wide while the frame stack is per thread: a stage running on
+    # another thread at the same time resets this one's peak and adds its own allocations
+    stack = getattr(_memory_frames, 'stack', None)
+    if stack is None:
+        stack = _memory_frames.stack = []
+    current, peak = tracemalloc.get_traced_memory()
+    if stack:
+        stack[-1]['peak'] = max(stack[-1]['peak'], peak)  # keep the enclosing stage's peak across the reset
+    tracemalloc.reset_peak()
+    stack.append({'start': current, 'peak': current})
+
+
+def _memory_exit():
+    frame = _memory_frames.stack.pop()
+    peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+    if _memory_frames.stack:
+        _memory_frames.stack[-1]['peak'] = max(_memory_frames.stack[-1]['peak'], peak)
+    return peak - frame['start']
+
+
+@contextmanager
+def stage(name, spectra=0, nbytes=0):
+    """
+    Time one processing stage.
+
+        with metrics.stage('parse_files', spectra=len(paths)) as s:
+            ...
+            s.add(nbytes=size)
+    """
+    handle = Stage(name)
+    handle.add(spectra, nbytes)
+    if not METRICS_ENABLED:
+        yield handle
+        return
+
+    tracing = METRICS_TRACE_MEMORY and tracemalloc.is_tracing()
+    if tracing:
+        _memory_enter()
+    started = time.perf_counter()
+    try:
+        yield handle
+    except Exception:
+        inc('stage_errors_total', stage=name)
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        observe('stage_duration_seconds', duration, stage=name)
+        if handle.spectra:
+            inc('stage_spectra_total', handle.spectra, stage=name)
+        if handle.nbytes:
+            inc('stage_bytes_total', handle.nbytes, stage=name)
+        if tracing:
+            set_max('stage_peak_memory_bytes', _memory_exit(), stage=name)
+        timings = _request_timings.get()
+        if timings is not None:
+            total, count = timings.get(name, (0.0, 0))
+            timings[name] = (total + duration, count + 1)
+
+
+def timed(name):
+    """Decorator form of stage() for a whole function."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _peak_rss():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == 'Darwin' else peak * 1024  # bytes on macOS, KiB on Linux
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+def render():
+    """Every metric in the Prometheus text exposition format."""
+    peak_rss = _peak_rss()
+    if peak_rss is not None:
+        set_max('process_peak_rss_bytes', peak_rss)
+
+    lines = []
+    with _lock:
+        series = {}
+        for store in (_counters, _gauges, _histograms):
+            for (name, labels), value in store.items():
+                series.setdefault(name, []).append((labels, value))
+
+        for name in sorted(series):
+            full_name = f'{PREFIX}_{name}'
+            kind, text = _help.get(name, ('untyped', ''))
+            lines.append(f'# HELP {full_name} {text}')
+            lines.append(f'# TYPE {full_name} {kind}')
+            for labels, value in sorted(series[name]):
+                if kind != 'histogram':
+                    lines.append(f'{full_name}{_format_labels(labels)} {value}')
+                    continue
+                buckets, counts = value
+                cumulative = 0
+                for bound, count in zip(buckets + ('+Inf',), counts[:-1]):
+                    cumulative += count
+                    lines.append(f'{full_name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{full_name}_sum{_format_labels(labels)} {counts[-1]}')
+                lines.append(f'{full_name}_count{_format_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def _server_timing(timings, total):
+    entries = [f'{name};dur={duration * 1000:.1f};desc="{count}x"' for name, (duration, count) in timings.items()]
+    entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries)
+
+
+def init_app(app):
+    """Time every request and attach a Server-Timing breakdown of the stages it ran."""
+    from flask import g, request
+
+    if not METRICS_ENABLED:
+        return
+
+    @app.before_request
+    def _start_request_timing():
+        g.metrics_started = time.perf_counter()
+        g.metrics_token = _request_timings.set({})
+
+    @app.after_request
+    def _finish_request_timing(response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        total = time.perf_counter() - started
+        timings = _request_timings.get() or {}
+        try:
+            _request_timings.reset(g.pop('metrics_token'))
+        except ValueError:
+            pass  # after_request ran in a different context than before_request
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        observe('http_request_duration_seconds', total, endpoint=endpoint, method=request.method,
+                status=response.status_code)
+        response.headers['Server-Timing'] = _server_timing(timings, total)
+        response.headers['Timing-Allow-Origin'] = '*'
+        logging.debug(f"{request.method} {endpoint} took {total:.3f}s")
+        return response
@@ -10,6 +10,21 @@ import pickle
 import logging
 import time
 import os
+import uuid
+import threading
+from collections import OrderedDict
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from q_converter import convert_q_axis
+from regridder import uniform_grid, resample_stack
+from axis_index import range_indexers, slice_array
+from derived_arrays import derived_for
+from artifacts import artifact_dir, ORIGIN
+import side_writer
+import metrics
+from render_cache import cached_render
+from raster import render_preview_grid
+from decimation import decimate_for_display
 
 plt.switch_backend('Agg')
 
@@ -30,7 +45,9 @@ def convert_to_float(value):
         return value
 
 
-def create_plot(explist, exptitles, save2D=True, num_xticks=5, num_yticks=5, num_cols=2, apply_log=True):
+@metrics.timed('create_plot')
+def create_plot(explist, exptitles, save2D=True, num_xticks=5, num_yticks=5, num_cols=2, apply_log=True,
+                decimate=True, decimation='max', dpi=300):
     import matplotlib
     matplotlib.use('Agg')
     num_subplots = len(explist)
@@ -59,14 +76,14 @@ def create_plot(explist, exptitles, save2D=True, num_xticks=5, num_yticks=5, num
             logging.warning(f"DataFrame for {title} is empty, skipping plot.")
             continue
 
-        Z = df.values
-        
-        if apply_log and np.issubdtype(Z.dtype, np.number):
-            Z = np.log1p(Z)
-        
+        Z = derived_for(df).intensity(apply_log)
+
         x = df.columns.astype(float)
         y = df.index.astype(float)
 
+        if decimate:
+            Z = decimate_for_display(Z, (subplot_width, subplot_height), dpi=dpi, method=decimation)
+
         ax = axs[i]
         im = ax.imshow(Z, aspect='auto', origin='lower', extent=[x.min(), x.max(), y.min(), y.max()], cmap='inferno')
         ax.set_title(title, fontsize=20)
@@ -89,7 +106,7 @@ def create_plot(explist, exptitles, save2D=True, num_xticks=5, num_yticks=5, num
     img_bytes = BytesIO()
 
     try:
-        plt.savefig(img_bytes, format='png', bbox_inches='tight', dpi=300)
+        plt.savefig(img_bytes, format='png', bbox_inches='tight', dpi=dpi)
         img_bytes.seek(0)
         plt.close(fig)
         logging.debug("Image saved successfully.")
@@ -102,7 +119,7 @@ def create_plot(explist, exptitles, save2D=True, num_xticks=5, num_yticks=5, num
     return img_bytes
 
 
-def plot_x_profiles(explist, exptitles, method='mean', col_nums=4, plot=False):
+def plot_x_profiles(explist, exptitles, method='mean', col_nums=4, plot=False, progress=None):
     num_dfs = len(explist)
     row_nums = math.ceil(num_dfs / col_nums)
 
@@ -120,14 +137,17 @@ def plot_x_profiles(explist, exptitles, method='mean', col_nums=4, plot=False):
             profile = df.median(axis=0)
         else:
             logging.warning(f"Invalid method: {method}. Skipping {title}.")
+            if progress is not None:
+                progress.advance('profiles_fitted')
             continue  # Skip this entry
 
         x_data = np.arange(len(profile))
         y_data = profile.values
 
         try:
-            popt_gauss, _ = curve_fit(gaussian, x_data, y_data, p0=[max(y_data), np.argmax(y_data), 1])
-            popt_lorentz, _ = curve_fit(lorentzian, x_data, y_data, p0=[max(y_data), np.argmax(y_data), 1])
+            with metrics.stage('curve_fit', spectra=1):
+                popt_gauss, _ = curve_fit(gaussian, x_data, y_data, p0=[max(y_data), np.argmax(y_data), 1])
+                popt_lorentz, _ = curve_fit(lorentzian, x_data, y_data, p0=[max(y_data), np.argmax(y_data), 1])
 
             x_index_gauss = int(round(popt_gauss[1]))
             x_index_lorentz = int(round(popt_lorentz[1]))
@@ -168,6 +188,9 @@ def plot_x_profiles(explist, exptitles, method='mean', col_nums=4, plot=False):
             gauss_peak_x.append(None)
             lorentz_peak_x.append(None)
 
+        if progress is not None:
+            progress.advance('profiles_fitted')
+
     if plot:
         for j in range(i + 1, len(axes)):
             fig.delaxes(axes[j])
@@ -178,7 +201,7 @@ def plot_x_profiles(explist, exptitles, method='mean', col_nums=4, plot=False):
     return gauss_peak_x, lorentz_peak_x
 
 
-def plot_y_profiles(explist, exptitles, method='mean', col_nums=4, plot=False):
+def plot_y_profiles(explist, exptitles, method='mean', col_nums=4, plot=False, progress=None):
     num_dfs = len(explist)
     row_nums = math.ceil(num_dfs / col_nums)
 
@@ -196,6 +219,8 @@ def plot_y_profiles(explist, exptitles, method='mean', col_nums=4, plot=False):
             profile = df.median(axis=1)
         else:
             logging.warning(f"Invalid method: {method}. Skipping {title}.")
+            if progress is not None:
+                progress.advance('profiles_fitted')
             continue  # Skip this entry
 
         x_data = np.arange(len(profile))
@@ -203,8 +228,9 @@ def plot_y_profiles(explist, exptitles, method='mean', col_nums=4, plot=False):
         x_labels = profile.index
 
         try:
-            popt_gauss, _ = curve_fit(gaussian, x_data, y_data, p0=[max(y_data), np.argmax(y_data), 1])
-            popt_lorentz, _ = curve_fit(lorentzian, x_data, y_data, p0=[max(y_data), np.argmax(y_data), 1])
+            with metrics.stage('curve_fit', spectra=1):
+                popt_gauss, _ = curve_fit(gaussian, x_data, y_data, p0=[max(y_data), np.argmax(y_data), 1])
+                popt_lorentz, _ = curve_fit(lorentzian, x_data, y_data, p0=[max(y_data), np.argmax(y_data), 1])
 
             y_index_gauss = int(round(popt_gauss[1]))
             y_index_lorentz = int(round(popt_lorentz[1]))
@@ -239,6 +265,9 @@ def plot_y_profiles(explist, exptitles, method='mean', col_nums=4, plot=False):
             gauss_peak_y.append(None)
             lorentz_peak_y.append(None)
 
+        if progress is not None:
+            progress.advance('profiles_fitted')
+
     if plot:
         for j in range(i + 1, len(axes)):
             fig.delaxes(axes[j])
@@ -249,7 +278,17 @@ def plot_y_profiles(explist, exptitles, method='mean', col_nums=4, plot=False):
     return gauss_peak_y, lorentz_peak_y
 
 
-def origin_dataframes(explist, peak_x, peak_y, exptitles, save=True, filename="shifted_data"):
+@metrics.timed('origin_dataframes')
+def origin_dataframes(explist, peak_x, peak_y, exptitles, save=True, filename="shifted_data", namespace=None,
+                      save_format=None):
+    # Side-output goes through the background writer; save_format defaults to ORIGIN_SAVE_FORMAT
+    save_format = save_format or side_writer.ORIGIN_SAVE_FORMAT
+    save = save and filename and save_format != 'none'
+    if save:
+        origin_dir = os.path.relpath(artifact_dir(ORIGIN, namespace))
+        batch_id = uuid.uuid4().hex[:8]  # unique per call, so no exists() probing for a free name
+        ext = side_writer.extension(save_format)
+
     peak_x = [convert_to_float(x) for x in peak_x if x is not None]
     peak_y = [convert_to_float(y) for y in peak_y if y is not None]
 
@@ -285,21 +324,16 @@ def origin_dataframes(explist, peak_x, peak_y, exptitles, save=True, filename="s
 
         shifted_explist.append(shift_df)
 
-        if save and filename:
-            if not os.path.exists('origin'):
-                os.makedirs('origin')
-            save_filename = f"origin/{filename}_{exptitles[i]}.csv"
-            counter = 1
-            while os.path.exists(save_filename):
-                save_filename = f"origin/{filename}_{exptitles[i]}_{counter:03}.csv"
-                counter += 1
-            shift_df.to_csv(save_filename)
-            logging.info(f"Saved shifted DataFrame {i} to {save_filename}.")
+        if save:
+            save_filename = os.path.join(origin_dir, f"{filename}_{exptitles[i]}_{batch_id}.{ext}")
+            side_writer.submit(save_filename, shift_df, save_format)
+            logging.info(f"Queued shifted DataFrame {i} for {save_filename}.")
 
     return shifted_explist
 
 
-def shift_and_preview(explist, exptitles, plot=True):
+@metrics.timed('shift_and_preview')
+def shift_and_preview(explist, exptitles, plot=True, namespace=None, progress=None):
     if not explist or not exptitles:
         logging.error("Explist 또는 exptitles이 비어 있음")
         return None, None, [], None
@@ -307,10 +341,14 @@ def shift_and_preview(explist, exptitles, plot=True):
     logging.debug(f"Received explist: {explist}")
     logging.debug(f"Received exptitles: {exptitles}")
     
-    gauss_peak_x_mean, _ = plot_x_profiles(explist, exptitles, method='mean', col_nums=4)
-    gauss_peak_y_mean, _ = plot_y_profiles(explist, exptitles, method='mean', col_nums=4)
+    # `progress` (a jobs.Job) counts fitted profiles: one x and one y profile per spectrum
+    if progress is not None:
+        progress.set_total('profiles_fitted', 2 * len(explist))
+    gauss_peak_x_mean, _ = plot_x_profiles(explist, exptitles, method='mean', col_nums=4, progress=progress)
+    gauss_peak_y_mean, _ = plot_y_profiles(explist, exptitles, method='mean', col_nums=4, progress=progress)
 
-    explist_shifted_gauss = origin_dataframes(explist.copy(), gauss_peak_x_mean, gauss_peak_y_mean, exptitles, save=True, filename="gauss_shifted")
+    explist_shifted_gauss = origin_dataframes(explist.copy(), gauss_peak_x_mean, gauss_peak_y_mean, exptitles, save=True,
+                                              filename="gauss_shifted", namespace=namespace)
 
     # Save explist_shifted_gauss, exptitles, gauss_peak_x, gauss_peak_y
     data_to_save = {
@@ -320,186 +358,270 @@ def shift_and_preview(explist, exptitles, plot=True):
         "gauss_peak_y_mean": gauss_peak_y_mean
     }
     
-    with open("explist_shifted_gauss.pkl", "wb") as f:
+    # Shared cwd file without a namespace; otherwise next to this client's origin/ output
+    summary_path = "explist_shifted_gauss.pkl"
+    if namespace is not None:
+        summary_path = os.path.join(artifact_dir(ORIGIN, namespace), summary_path)
+    with metrics.stage('pickle_summary') as timing, open(summary_path, "wb") as f:
         pickle.dump(data_to_save, f)
-        logging.info("Data saved to explist_shifted_gauss.pkl")
+        timing.add(nbytes=f.tell())
+        logging.info(f"Data saved to {summary_path}")
 
     img_bytes = None
     if plot:
-        img_bytes = create_plot(explist_shifted_gauss, exptitles)
+        _, img_bytes = cached_render(create_plot, explist_shifted_gauss, exptitles)
 
     return gauss_peak_x_mean, gauss_peak_y_mean, explist_shifted_gauss, img_bytes
 
 
-def angle_to_q(angle, E0, E_loss):
-    if E_loss < 0 or angle < 0:
-        return np.nan
-
-    hbar_eV = 6.582119569e-16  # eV*s
-    m_e_eV = 0.5109989461e6 / (299792458**2)  # eV/(m/s)^2
-    c = 299792458  # m/s
-
-    k0 = np.sqrt(2 * m_e_eV * E0) / (hbar_eV * c)
-    k1 = np.sqrt(2 * m_e_eV * (E0 - E_loss)) / (hbar_eV * c)
-
-    q = np.sqrt(k0**2 + k1**2 - 2*k0*k1*np.cos(angle))
-
-    return q  # Å^-1로 변환
-
-def process_q_values(q_values, debugging=False):
-    valid_q = q_values[~np.isnan(q_values) & ~np.isinf(q_values)]
-
-    if debugging:
-        print(f"Valid q values: {valid_q}")
-
-    if len(valid_q) == 0:
-        if debugging:
-            print("No valid q values found, returning original q_values")
-        return q_values
-
-    positive_q = valid_q[valid_q > 0]
-    if len(positive_q) == 0:
-        if debugging:
-            print("No positive q values found, returning original q_values")
-        return q_values
-
-    min_positive_q = np.min(positive_q)
-    q_step = np.min(np.diff(np.sort(valid_q)))
-
-    if debugging:
-        print(f"Minimum positive q: {min_positive_q}")
-        print(f"Calculated q_step: {q_step}")
-
-    if q_step > 0:
-        num_nan = np.sum(np.isnan(q_values))
-        negative_q = np.arange(0, -num_nan * q_step, -q_step)[::-1]
+def prepare_q_panels(explist, exptitles, gauss_y=None, q_min=None, q_max=None, E_min=None, E_max=None,
+                     apply_log=True, q_conversion=False, process_q=True, regrid=False, q_grid_points=None):
+    """
+    Crop, log-scale and (optionally) q-convert every spectrum for plotting.
 
-        new_q_values = np.full_like(q_values, np.nan)
-        new_q_values[:len(negative_q)] = negative_q
-        new_q_values[len(negative_q):] = valid_q
-
-        if debugging:
-            print(f"Generated new_q_values (first 10): {new_q_values[:10]}")
-            print(f"Generated new_q_values (last 10): {new_q_values[-10:]}")
-
-        return new_q_values
-    else:
-        if debugging:
-            print("q_step is not positive, returning original q_values")
-        return q_values
-
-
-def plot_data_with_q_conversion(explist, exptitles, gauss_y=None, num_cols=2,
-                                q_min=None, q_max=None, E_min=None, E_max=None,
-                                figsize=(6, 5), title_fontsize=24, label_fontsize=16,
-                                cbar_pos=[0.92, 0.063, 0.02, 0.15], cmap='inferno',
-                                font_family='sans-serif', font_style='normal', font_weight='normal',
-                                num_ticks_x=5, num_ticks_y=5, tick_fontsize=14,
-                                apply_log=True, original_explist=None, q_conversion=False, x_label=None,
-                                show_colorbar=True, hide_y_axis_labels=True):
-
-    font_prop = fm.FontProperties(family=font_family, style=font_style, weight=font_weight)
-
-    def filter_dataframe_by_range(df, q_min, q_max, E_min, E_max):
-        columns_as_float = df.columns.astype(float)
-        index_as_float = df.index.astype(float)
-        filtered_df = df.loc[(index_as_float >= E_min) & (index_as_float <= E_max), 
-                             (columns_as_float >= q_min) & (columns_as_float <= q_max)]
-        return filtered_df
-
-    num_subplots = len(explist)
-    num_rows = (num_subplots + num_cols - 1) // num_cols
-
-    fig_width, fig_height = figsize
-    fig, axs = plt.subplots(num_rows, num_cols, figsize=(fig_width*num_cols, fig_height*num_rows))
-    
-    # Adjust space between plots
-    plt.subplots_adjust(hspace=0.4, wspace=0.4)
-
-    # Flatten axs only if it's an ndarray
-    if isinstance(axs, np.ndarray):
-        axs = axs.flatten()
-    else:
-        axs = [axs]  # If it's not an array, ensure it's a list
-
-    converted_explist = [] if q_conversion and gauss_y is not None else None
-    print(f"Converted explist initialized: {converted_explist is not None}")
+    Returns one dict per non-empty spectrum with its grid position, title,
+    image matrix `Z`, column axis `x`, energy-loss axis and E0.
+    """
+    cropped = q_min is not None and q_max is not None and E_min is not None and E_max is not None
 
+    panels = []
     for i, (df, title) in enumerate(zip(explist, exptitles)):
-        if q_min is not None and q_max is not None and E_min is not None and E_max is not None:
-            df = filter_dataframe_by_range(df, q_min, q_max, E_min, E_max)
+        derived = derived_for(df)
+        Z = derived.intensity(apply_log)
+        if cropped:
+            rows, cols = range_indexers(df, q_min, q_max, E_min, E_max)
+            df = df.iloc[rows, cols]
+            Z = slice_array(Z, rows, cols)
 
-        Z = df.values
         if Z.size == 0:
             continue
 
-        if apply_log and np.issubdtype(Z.dtype, np.number):
-            Z = np.log1p(Z)
-
         angles = df.columns.astype(float) * np.pi / 180
         energy_losses = df.index.astype(float)
 
+        E0 = None
         if q_conversion and gauss_y is not None:
             E0 = gauss_y[i]
-            q_values = np.array([angle_to_q(angle, E0, 0) for angle in angles])
-            processed_q_values = process_q_values(q_values)
-
-            converted_df = pd.DataFrame(Z, index=energy_losses, columns=processed_q_values)
-            converted_explist.append(converted_df)
+            processed_q_values = convert_q_axis(angles, E0, 0, process=process_q)
         else:
             processed_q_values = df.columns.astype(float)
 
+        panel = {'index': i, 'title': title, 'Z': Z, 'x': processed_q_values,
+                 'energy_losses': energy_losses, 'E0': E0}
+        if not cropped and not regrid and derived.numeric:
+            panel['clim'] = derived.min_max(apply_log)  # Z is the whole cached matrix
+        panels.append(panel)
+
+    # Resample every panel onto one uniform axis so imshow's extent is accurate
+    if regrid and panels:
+        target_grid = uniform_grid([panel['x'] for panel in panels], num_points=q_grid_points)
+        resampled = resample_stack([panel['Z'] for panel in panels],
+                                   [panel['x'] for panel in panels], target_grid)
+        for panel, Z in zip(panels, resampled):
+            panel['Z'] = Z
+            panel['x'] = target_grid
+
+    return panels
+
+
+@metrics.timed('convert_explist_to_q')
+def convert_explist_to_q(explist, exptitles, gauss_y, apply_log=True, process_q=True, regrid=False, q_grid_points=None):
+    """The q-converted explist plot_data_with_q_conversion returns, without rendering."""
+    panels = prepare_q_panels(explist, exptitles, gauss_y=gauss_y, apply_log=apply_log, q_conversion=True,
+                              process_q=process_q, regrid=regrid, q_grid_points=q_grid_points)
+    # Copy: panel matrices may be shared, read-only derived arrays
+    return [pd.DataFrame(panel['Z'], index=panel['energy_losses'], columns=panel['x'], copy=True) for panel in panels]
+
+
+_PLACEHOLDER = np.zeros((2, 2))  # image data of a renderer between renders
+
+
+class GridRenderer:
+    """
+    Long-lived heatmap grid figure for one layout.
+
+    The figure, axes, image artists, titles and colorbar are built once;
+    render() only swaps image data, extents, titles and axis labels, then
+    saves. Fonts are set on the text artists themselves (never through
+    rcParams, which every thread shares). Renderers are shared, so render()
+    holds a lock.
+    """
+
+    def __init__(self, num_panels, num_cols=2, figsize=(6, 5), label_fontsize=16, tick_fontsize=14, cbar_pos=(0.92, 0.063, 0.02, 0.15), cmap='inferno',
+                 font_family='sans-serif', font_style='normal', font_weight='normal',
+                 show_colorbar=True, hide_y_axis_labels=True):
+        self.num_panels = num_panels
+        self.num_cols = num_cols
+        self.num_rows = (num_panels + num_cols - 1) // num_cols
+        self.figsize = figsize
+        self.hide_y_axis_labels = hide_y_axis_labels
+        self.label_fontsize = label_fontsize
+        self.tick_fontsize = tick_fontsize
+        self.font_prop = fm.FontProperties(family=font_family, style=font_style, weight=font_weight)
+        self._lock = threading.Lock()
+
+        fig_width, fig_height = figsize
+        # A bare Figure, not pyplot: templates live for the whole process
+        self.fig = Figure(figsize=(fig_width * num_cols, fig_height * self.num_rows))
+        FigureCanvasAgg(self.fig)
+        axs = np.atleast_1d(self.fig.subplots(self.num_rows, num_cols, squeeze=False)).flatten()
+        self.fig.subplots_adjust(hspace=0.4, wspace=0.4)
+
+        for ax in axs[num_panels:]:
+            self.fig.delaxes(ax)
+        self.axes = list(axs[:num_panels])
+
+        self.images = []
+        for i, ax in enumerate(self.axes):
+            self.images.append(ax.imshow(_PLACEHOLDER, aspect='auto', origin='lower', cmap=cmap))
+            # set_title(fontsize=..., fontproperties=...) always resolved to the font_prop size
+            ax.title.set_fontproperties(self.font_prop)
+            for label in (ax.xaxis.label, ax.yaxis.label):
+                label.set_fontproperties(self.font_prop)
+                label.set_fontsize(label_fontsize)
+            if hide_y_axis_labels and i % num_cols != 0:
+                ax.tick_params(axis='y', labelleft=False)
+
+        self.colorbar = None
+        if show_colorbar and self.images:
+            cbar_ax = self.fig.add_axes(list(cbar_pos))
+            self.colorbar = self.fig.colorbar(self.images[-1], cax=cbar_ax, orientation='vertical')
+
+        # Once is enough: ticks the locator adds on later renders copy their properties from the first tick
+        for ax in self.axes:
+            for label in ax.get_xticklabels() + ax.get_yticklabels():
+                label.set_fontproperties(self.font_prop)
+            ax.tick_params(axis='both', which='major', labelsize=self.tick_fontsize)
+        if self.colorbar is not None:
+            # Tick spacing follows label_fontsize, the labels themselves are drawn at the font_prop size
+            self.colorbar.ax.tick_params(labelsize=self.label_fontsize)
+            for label in self.colorbar.ax.get_yticklabels():
+                label.set_fontproperties(self.font_prop)
+
+    def render(self, panels, x_label, decimate=True, decimation='max', dpi=None):
+        with self._lock:
+            drawn = set()
+            for panel in panels:
+                i = panel['index']
+                Z = panel['Z']
+                if decimate:
+                    Z = decimate_for_display(Z, self.figsize, dpi=dpi, method=decimation)
+
+                im = self.images[i]
+                im.set_data(Z)
+                im.set_extent(panel['extent'])
+                im.autoscale()
+                im.set_visible(True)
+
+                ax = self.axes[i]
+                ax.title.set_text(panel['title'])
+                ax.xaxis.label.set_text(x_label)
+                ax.yaxis.label.set_text('' if self.hide_y_axis_labels and i % self.num_cols != 0 else 'Loss Energy (eV)')
+                drawn.add(i)
+
+            for i, (ax, im) in enumerate(zip(self.axes, self.images)):
+                if i not in drawn:  # spectrum skipped as empty in this render
+                    im.set_visible(False)
+                    ax.title.set_text('')
+
+            if self.colorbar is not None and drawn:
+                # Follow the colour scale of the last drawn panel, as the per-call figure did
+                self.colorbar.update_normal(self.images[max(drawn)])
+
+            img_bytes = BytesIO()
+            self.fig.savefig(img_bytes, format='png', bbox_inches='tight',
+                             dpi=dpi if dpi is not None else 'figure')
+            img_bytes.seek(0)
+            self._release_buffers()
+            return img_bytes
+
+    def _release_buffers(self):
+        # Cached renderers only keep the figure structure; the spectra and the
+        # Agg pixel buffer would otherwise stay resident until the next render
+        for im in self.images:
+            im.set_data(_PLACEHOLDER)
+        FigureCanvasAgg(self.fig)
+
+
+_grid_renderers = OrderedDict()
+_grid_renderers_lock = threading.Lock()
+MAX_GRID_RENDERERS = 8
+
+
+def get_grid_renderer(**layout):
+    """Shared GridRenderer for a layout (panel count, columns, fonts, ...), LRU-bounded."""
+    key = tuple(sorted((name, tuple(value) if isinstance(value, list) else value) for name, value in layout.items()))
+    with _grid_renderers_lock:
+        renderer = _grid_renderers.get(key)
+        if renderer is not None:
+            _grid_renderers.move_to_end(key)
+            return renderer
+
+        renderer = GridRenderer(**layout)
+        _grid_renderers[key] = renderer
+        while len(_grid_renderers) > MAX_GRID_RENDERERS:
+            _grid_renderers.popitem(last=False)
+        return renderer
+
+
+@metrics.timed('plot_data_with_q_conversion')
+def plot_data_with_q_conversion(explist, exptitles, gauss_y=None, num_cols=2,
+                                q_min=None, q_max=None, E_min=None, E_max=None,
+                                figsize=(6, 5), title_fontsize=24, label_fontsize=16,
+                                cbar_pos=[0.92, 0.063, 0.02, 0.15], cmap='inferno',
+                                font_family='sans-serif', font_style='normal', font_weight='normal',
+                                num_ticks_x=5, num_ticks_y=5, tick_fontsize=14,
+                                apply_log=True, original_explist=None, q_conversion=False, x_label=None,
+                                show_colorbar=True, hide_y_axis_labels=True, process_q=True,
+                                regrid=False, q_grid_points=None, preview=False, preview_format='png',
+                                decimate=True, decimation='max', dpi=None):
+
+    panels = prepare_q_panels(explist, exptitles, gauss_y=gauss_y, q_min=q_min, q_max=q_max, E_min=E_min, E_max=E_max,
+                              apply_log=apply_log, q_conversion=q_conversion, process_q=process_q,
+                              regrid=regrid, q_grid_points=q_grid_points)
+
+    converted_explist = None
+    if q_conversion and gauss_y is not None:
+        converted_explist = [pd.DataFrame(panel['Z'], index=panel['energy_losses'], columns=panel['x'], copy=True)
+                             for panel in panels]
+    print(f"Converted explist initialized: {converted_explist is not None}")
+
+    for panel in panels:
+        energy_losses = panel['energy_losses']
         if original_explist is not None:
-            energy_losses = original_explist[i].index.astype(float)
+            energy_losses = original_explist[panel['index']].index.astype(float)
 
-        q_min_plot = q_min if q_min is not None else np.nanmin(processed_q_values)
-        q_max_plot = q_max if q_max is not None else np.nanmax(processed_q_values)
+        q_min_plot = q_min if q_min is not None else np.nanmin(panel['x'])
+        q_max_plot = q_max if q_max is not None else np.nanmax(panel['x'])
         E_min_plot = E_min if E_min is not None else np.nanmin(energy_losses)
         E_max_plot = E_max if E_max is not None else np.nanmax(energy_losses)
 
-        extent = [q_min_plot, q_max_plot, E_min_plot, E_max_plot]
+        panel['extent'] = [q_min_plot, q_max_plot, E_min_plot, E_max_plot]
 
-        ax = axs[i]  # retrieve the correct Axes object
-        im = ax.imshow(Z, aspect='auto', origin='lower', extent=extent, cmap=cmap)
+    if preview:
+        # Fast path: LUT-mapped raster grid, no matplotlib figure at all
+        for panel in panels:
+            panel['title'] = f"{panel['title']}, E0 = {panel['E0']:.6f} eV" if panel['E0'] is not None else panel['title']
+        img_bytes = render_preview_grid(panels, num_cols=num_cols, cmap=cmap, fmt=preview_format,
+                                        num_panels=len(explist))
+        return img_bytes, converted_explist
 
-        ax.set_title(f"{title}, E0 = {E0:.6f} eV" if q_conversion and gauss_y is not None else title, fontsize=title_fontsize, fontproperties=font_prop)
-        
-        if x_label is not None:
-            ax.set_xlabel(x_label, fontsize=label_fontsize, fontproperties=font_prop)
-        else:
-            ax.set_xlabel('q (Å⁻¹)' if q_conversion and gauss_y is not None else 'Angle (degree)', fontsize=label_fontsize, fontproperties=font_prop)
-
-        ax.set_ylabel('Loss Energy (eV)', fontsize=label_fontsize, fontproperties=font_prop)
-
-        if hide_y_axis_labels and i % num_cols != 0:
-            ax.set_yticklabels([])
-            ax.set_ylabel("")
+    renderer = get_grid_renderer(num_panels=len(explist), num_cols=num_cols, figsize=tuple(figsize),
+                                 label_fontsize=label_fontsize, tick_fontsize=tick_fontsize, cbar_pos=tuple(cbar_pos), cmap=cmap,
+                                 font_family=font_family, font_style=font_style, font_weight=font_weight,
+                                 show_colorbar=show_colorbar, hide_y_axis_labels=hide_y_axis_labels)
 
-        for label in ax.get_xticklabels() + ax.get_yticklabels():
-            label.set_fontproperties(font_prop)
-
-        ax.tick_params(axis='both', which='major', labelsize=tick_fontsize)
-
-    # Remove any unused axes
-    for j in range(len(explist), len(axs)):
-        fig.delaxes(axs[j])
-
-    if show_colorbar and im is not None:
-        cbar_ax = fig.add_axes(cbar_pos)
-        cbar = fig.colorbar(im, cax=cbar_ax, orientation='vertical')
-        cbar.ax.tick_params(labelsize=label_fontsize)
-        for label in cbar.ax.get_yticklabels():
-            label.set_fontproperties(font_prop)
-        print("Colorbar added to the plot.")
+    q_axis = q_conversion and gauss_y is not None
+    if x_label is None:
+        x_label = 'q (Å⁻¹)' if q_axis else 'Angle (degree)'
+    for panel in panels:
+        if q_axis:
+            panel['title'] = f"{panel['title']}, E0 = {panel['E0']:.6f} eV"
 
     logging.debug(f"Data for plotting: {explist}")
-    #plt.tight_layout()
 
-    img_bytes = BytesIO()
     try:
-        plt.savefig(img_bytes, format='png', bbox_inches='tight')
-        img_bytes.seek(0)
-        plt.close(fig)
+        img_bytes = renderer.render(panels, x_label, decimate=decimate, decimation=decimation, dpi=dpi)
         print(f"Info: Image saved successfully, size: {img_bytes.getbuffer().nbytes} bytes.")
     except Exception as e:
         print(f"Error: Failed to save image: {str(e)}")
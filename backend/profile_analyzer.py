@@ -7,7 +7,13 @@ import math
 from scipy.optimize import curve_fit
 from io import BytesIO
 import base64
-from plotter import angle_to_q, process_q_values
+from q_converter import convert_q_axis
+from axis_index import AxisIndex, range_indexers, slice_array
+from derived_arrays import derived_for
+from integral_image import integral_image_for
+from array_payload import downsample_record
+from decimation import decimate_for_display
+import metrics
 
 plt.switch_backend('Agg')
 
@@ -24,62 +30,47 @@ def fwhm_lorentzian(gamma, scale):
     return 2 * gamma * scale
 
 
-def fit_and_plot_profiles(explist, exptitles, method='mean', col_nums=2, profile_axis='x', fit_function='gauss', num_xticks=5, num_yticks=5):
-    def process_index(profile):
-        try:
-            if isinstance(profile.index, pd.RangeIndex):
-                return profile  # RangeIndex는 이미 숫자형이므로 처리 불필요
-            str_index = profile.index.astype(str)
-            numeric_part = str_index.str.extract('(\d+\.?\d*)')[0]
-            numeric_index = pd.to_numeric(numeric_part, errors='coerce')
-            if numeric_index.isna().any():
-                print(f"Warning: Some index values couldn't be converted to numeric")
-                profile = profile[~numeric_index.isna()]
-                numeric_index = numeric_index.dropna()
-            profile.index = numeric_index
-            return profile
-        except Exception as e:
-            print(f"Error processing index: {str(e)}")
-            return profile
+def _process_index(profile):
+    try:
+        if isinstance(profile.index, pd.RangeIndex):
+            return profile  # RangeIndex는 이미 숫자형이므로 처리 불필요
+        str_index = profile.index.astype(str)
+        numeric_part = str_index.str.extract('(\d+\.?\d*)')[0]
+        numeric_index = pd.to_numeric(numeric_part, errors='coerce')
+        if numeric_index.isna().any():
+            print(f"Warning: Some index values couldn't be converted to numeric")
+            profile = profile[~numeric_index.isna()]
+            numeric_index = numeric_index.dropna()
+        profile.index = numeric_index
+        return profile
+    except Exception as e:
+        print(f"Error processing index: {str(e)}")
+        return profile
 
-    num_dfs = len(explist)
-    row_nums = math.ceil(num_dfs / col_nums)
-    fit_func = gaussian if fit_function == 'gauss' else lorentzian
-    fwhm_func = fwhm_gaussian if fit_function == 'gauss' else fwhm_lorentzian
 
-    fig, axes = plt.subplots(row_nums, col_nums, figsize=(16, row_nums * 5))
-    
-    # Flatten axes array only if it's an ndarray
-    if isinstance(axes, np.ndarray):
-        axes = axes.flatten()
-    else:
-        axes = [axes]  # If it's not an array, ensure it's a list
+def fit_profiles(explist, exptitles, method='mean', profile_axis='x', fit_function='gauss'):
+    """
+    Average each spectrum into an x (column) or y (row) profile and fit it.
 
-    peak_positions = []
-    fwhm_values = []
+    Returns one record per spectrum with the profile axis and values, the
+    fitted curve and the peak position / FWHM (None when the fit fails).
+    """
+    fit_func = gaussian if fit_function == 'gauss' else lorentzian
+    fwhm_func = fwhm_gaussian if fit_function == 'gauss' else fwhm_lorentzian
+    axis = 0 if profile_axis == 'x' else 1
+
+    fits = []
+    for df, title in zip(explist, exptitles):
+        if method == 'mean':
+            profile = df.mean(axis=axis)
+        elif method == 'median':
+            profile = df.median(axis=axis)
+        else:
+            raise ValueError("Method must be 'mean' or 'median'")
+        profile = _process_index(profile)
 
-    for i, (df, title) in enumerate(zip(explist, exptitles)):
-        ax = axes[i]
-        if profile_axis == 'x':
-            if method == 'mean':
-                profile = df.mean(axis=0)
-            elif method == 'median':
-                profile = df.median(axis=0)
-            else:
-                raise ValueError("Method must be 'mean' or 'median'")
-            profile = process_index(profile)
-            x_label = 'Columns'
-            y_label = 'Intensity'
-        else:  # y-profile
-            if method == 'mean':
-                profile = df.mean(axis=1)
-            elif method == 'median':
-                profile = df.median(axis=1)
-            else:
-                raise ValueError("Method must be 'mean' or 'median'")
-            profile = process_index(profile)
-            x_label = 'Rows'
-            y_label = 'Intensity'
+        record = {'title': title, 'x': profile.index, 'y': profile.values,
+                  'fit': None, 'peak': None, 'fwhm': None}
 
         try:
             x_data = np.arange(len(profile))
@@ -89,6 +80,8 @@ def fit_and_plot_profiles(explist, exptitles, method='mean', col_nums=2, profile
             valid_mask = ~np.isnan(y_data)
             x_data = x_data[valid_mask]
             y_data = y_data[valid_mask]
+            record['x'] = profile.index[valid_mask]
+            record['y'] = y_data
 
             if len(x_data) < 3:
                 raise ValueError("Not enough valid data points for fitting")
@@ -100,7 +93,8 @@ def fit_and_plot_profiles(explist, exptitles, method='mean', col_nums=2, profile
 
             initial_guess = [max_value, max_index, len(y_data) / 10 if fit_function == 'gauss' else len(y_data) / 20]
 
-            popt, _ = curve_fit(fit_func, x_data, y_data, p0=initial_guess)
+            with metrics.stage('curve_fit', spectra=1):
+                popt, _ = curve_fit(fit_func, x_data, y_data, p0=initial_guess)
 
             if np.any(np.isnan(popt)) or np.any(np.isinf(popt)):
                 raise ValueError("Invalid fitting results")
@@ -111,32 +105,62 @@ def fit_and_plot_profiles(explist, exptitles, method='mean', col_nums=2, profile
             else:
                 raise ValueError("x0 index out of bounds")
 
-            peak_positions.append(x0)
-            fwhm_value = fwhm_func(popt[2], scale)
-            fwhm_values.append(fwhm_value)
+            record['peak'] = x0
+            record['fwhm'] = fwhm_func(popt[2], scale)
+            record['fit'] = fit_func(x_data, *popt)
 
-            ax.plot(profile.index, fit_func(x_data, *popt), 'r--', label=f'Fit: x0={x0:.2f}, FWHM={fwhm_value:.5f}')
+        except Exception as e:
+            print(f"Error in fitting for {title}: {str(e)}")
+
+        fits.append(record)
+
+    return fits
+
+
+@metrics.timed('fit_and_plot_profiles')
+def fit_and_plot_profiles(explist, exptitles, method='mean', col_nums=2, profile_axis='x', fit_function='gauss', num_xticks=5, num_yticks=5):
+    num_dfs = len(explist)
+    row_nums = math.ceil(num_dfs / col_nums)
+
+    fig, axes = plt.subplots(row_nums, col_nums, figsize=(16, row_nums * 5))
+    
+    # Flatten axes array only if it's an ndarray
+    if isinstance(axes, np.ndarray):
+        axes = axes.flatten()
+    else:
+        axes = [axes]  # If it's not an array, ensure it's a list
+
+    x_label = 'Columns' if profile_axis == 'x' else 'Rows'
+    y_label = 'Intensity'
+
+    fits = fit_profiles(explist, exptitles, method=method, profile_axis=profile_axis, fit_function=fit_function)
+    peak_positions = [record['peak'] for record in fits]
+    fwhm_values = [record['fwhm'] for record in fits]
+
+    for i, record in enumerate(fits):
+        ax = axes[i]
+        title, x_index, y_data = record['title'], record['x'], record['y']
+
+        if record['fit'] is not None:
+            x0 = record['peak']
+            fwhm_value = record['fwhm']
+            ax.plot(x_index, record['fit'], 'r--', label=f'Fit: x0={x0:.2f}, FWHM={fwhm_value:.5f}')
 
             fwhm_start = x0 - fwhm_value / 2
             fwhm_end = x0 + fwhm_value / 2
 
             ax.axvline(x=fwhm_start, color='r', linestyle=':', linewidth=1)
             ax.axvline(x=fwhm_end, color='r', linestyle=':', linewidth=1)
-
-        except Exception as e:
-            print(f"Error in fitting for {title}: {str(e)}")
-            peak_positions.append(None)
-            fwhm_values.append(None)
         
-        ax.scatter(profile.index, y_data, label='Profile', alpha=0.7)
+        ax.scatter(x_index, y_data, label='Profile', alpha=0.7)
         ax.set_title(f'{title} - {profile_axis.upper()}-profile', fontsize=24)
         ax.set_xlabel(x_label)
         ax.set_ylabel(y_label)
         ax.legend(fontsize=20)
 
-        formatted_xticklabels = [f'{x:.1f}' if isinstance(x, (int, float)) else str(x) for x in profile.index]
-        x_ticks = np.linspace(0, len(profile.index) - 1, num_xticks, dtype=int)
-        ax.set_xticks([profile.index[j] for j in x_ticks])
+        formatted_xticklabels = [f'{x:.1f}' if isinstance(x, (int, float)) else str(x) for x in x_index]
+        x_ticks = np.linspace(0, len(x_index) - 1, num_xticks, dtype=int)
+        ax.set_xticks([x_index[j] for j in x_ticks])
         ax.set_xticklabels([formatted_xticklabels[j] for j in x_ticks], rotation=90, ha="right", fontsize=18)
 
         y_ticks = np.linspace(min(y_data), max(y_data), num_yticks)
@@ -144,7 +168,7 @@ def fit_and_plot_profiles(explist, exptitles, method='mean', col_nums=2, profile
         ax.tick_params(axis='y', labelsize=16)
 
     # Remove unused axes if any
-    for j in range(i + 1, len(axes)):
+    for j in range(len(fits), len(axes)):
         fig.delaxes(axes[j])
 
     #plt.tight_layout()
@@ -158,6 +182,7 @@ def fit_and_plot_profiles(explist, exptitles, method='mean', col_nums=2, profile
 
 
 
+@metrics.timed('generate_profile_data')
 def generate_profile_data(explist, exptitles, profile_axis, method='mean'):
     try:
         peak_positions, fwhm_values, img_bytes = fit_and_plot_profiles(
@@ -176,12 +201,119 @@ def generate_profile_data(explist, exptitles, profile_axis, method='mean'):
         raise
 
 
+def compute_line_cut(df, value, window_size=0, plot='x', aggregation='mean',
+                     x_min=None, x_max=None, y_min=None, y_max=None, E0=None, table_key=None):
+    """
+    Compute one windowed line cut of a spectrum.
+
+    plot='x' averages the columns around `value` (angle, or q when E0 is
+    given) into an energy-loss profile; plot='y' averages the rows around
+    `value` into an angular/q profile. Mean cuts over sorted axes are read
+    from the spectrum's cached integral image.
+    """
+    if aggregation not in ('mean', 'median'):
+        raise ValueError("Invalid aggregation method. Use 'mean' or 'median'.")
+
+    rows = AxisIndex(df.index).locate(y_min, y_max)
+    cols = AxisIndex(df.columns).locate(x_min, x_max)
+
+    energy_losses = np.asarray(df.index, dtype=float)[rows]
+    columns = np.asarray(df.columns, dtype=float)[cols]
+    if energy_losses.size == 0 or columns.size == 0:
+        return None
+
+    x_values = convert_q_axis(columns * np.pi / 180, E0, 0) if E0 is not None else columns
+
+    cut_axis = x_values if plot == 'x' else energy_losses
+    nearest = int(np.nanargmin(np.abs(cut_axis - value)))
+    center = float(cut_axis[nearest])
+    window_start = center - window_size / 2
+    window_end = center + window_size / 2
+
+    if window_size > 0:
+        window = AxisIndex(cut_axis).locate(window_start, window_end)
+    else:
+        window = slice(nearest, nearest + 1)
+
+    if aggregation == 'mean' and all(isinstance(s, slice) for s in (rows, cols, window)):
+        table = integral_image_for(df, table_key)
+        r0, r1, _ = rows.indices(df.shape[0])
+        c0, c1, _ = cols.indices(df.shape[1])
+        w0, w1, _ = window.indices(len(cut_axis))
+        if plot == 'x':
+            intensity = table.column_window_mean(c0 + w0, c0 + w1, r0, r1)
+        else:
+            intensity = table.row_window_mean(r0 + w0, r0 + w1, c0, c1)
+    else:
+        values = np.asarray(df.values, dtype=float)[rows][:, cols]
+        reduce = np.nanmean if aggregation == 'mean' else np.nanmedian
+        if plot == 'x':
+            intensity = reduce(values[:, window], axis=1)
+        else:
+            intensity = reduce(values[window, :], axis=0)
+
+    return {
+        'center': center,
+        'window': (window_start, window_end),
+        'axis': energy_losses if plot == 'x' else x_values,
+        'intensity': intensity,
+    }
+
+
+@metrics.timed('generate_line_cut_data')
+def generate_line_cut_data(explist, exptitles, gauss_y=None, value=75, window_size=0, plot='x',
+                           aggregation='mean', x_min=None, x_max=None, y_min=None, y_max=None,
+                           q_conversion=False, dataset_key=None, max_points=None):
+    line_cuts = []
+    for idx, (df, title) in enumerate(zip(explist, exptitles)):
+        E0 = gauss_y[idx] if q_conversion and gauss_y is not None else None
+        table_key = (dataset_key, idx) if dataset_key is not None else None
+
+        cut = compute_line_cut(df, value, window_size=window_size, plot=plot, aggregation=aggregation,
+                               x_min=x_min, x_max=x_max, y_min=y_min, y_max=y_max,
+                               E0=E0, table_key=table_key)
+        if cut is None:
+            line_cuts.append({'title': title, 'axis': np.empty(0), 'intensity': np.empty(0),
+                              'center': None, 'window': None})
+            continue
+
+        record = {
+            'title': title,
+            'center': cut['center'],
+            'window': list(cut['window']),
+            'axis': cut['axis'],
+            'intensity': cut['intensity'],
+        }
+        line_cuts.append(downsample_record(record, ('axis', 'intensity'), 'intensity', max_points))
+
+    return line_cuts
+
+
+@metrics.timed('generate_profile_arrays')
+def generate_profile_arrays(explist, exptitles, profile_axis, method='mean', fit_function='gauss', max_points=None):
+    """
+    Same profiles and fits as generate_profile_data, as numeric arrays
+    downsampled to `max_points` instead of a rendered figure.
+    """
+    records = []
+    for record in fit_profiles(explist, exptitles, method=method, profile_axis=profile_axis,
+                               fit_function=fit_function):
+        record = dict(record, x=np.asarray(record['x'], dtype=float),
+                      peak=None if pd.isna(record['peak']) else float(record['peak']),
+                      fwhm=None if pd.isna(record['fwhm']) else float(record['fwhm']))
+        records.append(downsample_record(record, ('x', 'y', 'fit'), 'y', max_points))
+
+    return records
+
+
+@metrics.timed('plot_intensity_profiles_with_heatmap')
 def plot_intensity_profiles_with_heatmap(explist, exptitles, gauss_y=None, value=75, window_size=0, plot='x',
                                          aggregation='mean', x_min=None, x_max=None, y_min=None, y_max=None,
                                          figsize=(5, 5), title_fontsize=16, label_fontsize=12, tick_fontsize=10,
                                          cmap='inferno', font_family='sans-serif', font_style='normal', font_weight='normal',
                                          apply_log=True, q_conversion=False, x_label=None, 
-                                         width_ratio=(3.5, 1), vertical=True, hide_ticks=True, lgnd=False):
+                                         width_ratio=(3.5, 1), vertical=True, hide_ticks=True, lgnd=False,
+                                         decimate=True, decimation='max'):
     """
     Plot intensity profiles and heatmaps for multiple experiments.
     """
@@ -194,58 +326,36 @@ def plot_intensity_profiles_with_heatmap(explist, exptitles, gauss_y=None, value
     if num_exp == 1:
         axs = axs.reshape(1, -1)
 
-    def filter_dataframe_by_range(df, x_min, x_max, y_min, y_max):
-        columns_as_float = df.columns.astype(float)
-        index_as_float = df.index.astype(float)
-        
-        x_mask = pd.Series(True, index=columns_as_float)
-        y_mask = pd.Series(True, index=index_as_float)
-        
-        if x_min is not None:
-            x_mask &= columns_as_float >= x_min
-        if x_max is not None:
-            x_mask &= columns_as_float <= x_max
-        if y_min is not None:
-            y_mask &= index_as_float >= y_min
-        if y_max is not None:
-            y_mask &= index_as_float <= y_max
-        
-        filtered_df = df.loc[y_mask, x_mask]
-        return filtered_df
-
-    def find_nearest(array, value):
-        array = np.asarray(array)
-        idx = (np.abs(array - value)).argmin()
-        return array[idx]
-
     for idx, (df, title) in enumerate(zip(explist, exptitles)):
         ax1, ax2 = axs[idx]
 
         # Filter the dataframe based on provided x_min, x_max, y_min, y_max
-        df = filter_dataframe_by_range(df, x_min, x_max, y_min, y_max)
+        rows, cols = range_indexers(df, x_min, x_max, y_min, y_max)
+        Z = slice_array(derived_for(df).intensity(apply_log), rows, cols)
+        df = df.iloc[rows, cols]
 
-        Z = df.values
         if Z.size == 0:
             print(f"Warning: No data in the specified range for {title}")
             continue
 
-        if apply_log and np.issubdtype(Z.dtype, np.number):
-            Z = np.log1p(Z)
-
         columns = df.columns.astype(float)
         energy_losses = df.index.astype(float)
 
+        E0 = None
         if q_conversion and gauss_y is not None:
             E0 = gauss_y[idx]
             angles = columns * np.pi / 180
-            q_values = np.array([angle_to_q(angle, E0, 0) for angle in angles])
-            processed_q_values = process_q_values(q_values)
+            processed_q_values = convert_q_axis(angles, E0, 0)
         else:
             processed_q_values = columns
 
         extent = [np.min(processed_q_values), np.max(processed_q_values),
                   np.min(energy_losses), np.max(energy_losses)]
 
+        if decimate:
+            heatmap_width = figsize[0] * width_ratio[0] / sum(width_ratio)
+            Z = decimate_for_display(Z, (heatmap_width, figsize[1]), method=decimation)
+
         # Plot heatmap
         im = ax1.imshow(Z, aspect='auto', origin='lower', extent=extent, cmap=cmap)
 
@@ -266,23 +376,19 @@ def plot_intensity_profiles_with_heatmap(explist, exptitles, gauss_y=None, value
         ax1.tick_params(axis='both', which='major', labelsize=tick_fontsize)
 
         # Plot intensity profile
-        if plot == 'x':
-            nearest_value = find_nearest(processed_q_values, value)
-            window_start = nearest_value - window_size / 2
-            window_end = nearest_value + window_size / 2
-            window_cols = processed_q_values[(processed_q_values >= window_start) & (processed_q_values <= window_end)]
-            
-            if window_size > 0:
-                if aggregation == 'mean':
-                    intensity_values = df.loc[:, window_cols].mean(axis=1)
-                elif aggregation == 'median':
-                    intensity_values = df.loc[:, window_cols].median(axis=1)
-                else:
-                    raise ValueError("Invalid aggregation method. Use 'mean' or 'median'.")
-            else:
-                intensity_values = df.loc[:, nearest_value]
+        if plot not in ('x', 'y'):
+            raise ValueError("Invalid plot axis. Use 'x' or 'y'.")
+
+        cut = compute_line_cut(explist[idx], value, window_size=window_size, plot=plot, aggregation=aggregation,
+                               x_min=x_min, x_max=x_max, y_min=y_min, y_max=y_max,
+                               E0=E0)
+        nearest_value = cut['center']
+        window_start, window_end = cut['window']
+        intensity_values = cut['intensity']
 
-            y_values = energy_losses
+        axis_label = 'q (Å⁻¹)' if q_conversion and gauss_y is not None else 'Angle (degree)'
+        if plot == 'x':
+            y_values = cut['axis']
             if vertical:
                 ax2.plot(intensity_values, y_values, label=f"{title}")
                 ax2.set_xlabel("Intensity\n(Arb. Units)")
@@ -296,30 +402,15 @@ def plot_intensity_profiles_with_heatmap(explist, exptitles, gauss_y=None, value
                 ax1.axvspan(window_start, window_end, color='y', alpha=0.2)
             print(f"Using x_value: {nearest_value} with window size: {window_size} for {title}")
             
-        elif plot == 'y':
-            nearest_value = find_nearest(energy_losses, value)
-            window_start = nearest_value - window_size / 2
-            window_end = nearest_value + window_size / 2
-            window_rows = energy_losses[(energy_losses >= window_start) & (energy_losses <= window_end)]
-            
-            if window_size > 0:
-                if aggregation == 'mean':
-                    intensity_values = df.loc[window_rows, :].mean(axis=0)
-                elif aggregation == 'median':
-                    intensity_values = df.loc[window_rows, :].median(axis=0)
-                else:
-                    raise ValueError("Invalid aggregation method. Use 'mean' or 'median'.")
-            else:
-                intensity_values = df.loc[nearest_value, :]
-
-            x_values = processed_q_values
+        else:
+            x_values = cut['axis']
             if vertical:
                 ax2.plot(intensity_values, x_values, label=f"{title}")
                 ax2.set_xlabel("Intensity (Arb. Units)")
-                ax2.set_ylabel('q (Å⁻¹)' if q_conversion and gauss_y is not None else 'Angle (degree)')
+                ax2.set_ylabel(axis_label)
             else:
                 ax2.plot(x_values, intensity_values, label=f"{title}")
-                ax2.set_xlabel('q (Å⁻¹)' if q_conversion and gauss_y is not None else 'Angle (degree)')
+                ax2.set_xlabel(axis_label)
                 ax2.set_ylabel("Intensity (Arb. Units)")
             
             if window_size > 0:
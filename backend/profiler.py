@@ -0,0 +1,170 @@
+import io
+import os
+import time
+import uuid
+import hmac
+import json
+import random
+import pstats
+import cProfile
+import logging
+import threading
+
+import artifacts
+
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))  # fraction of requests profiled unasked
+PROFILE_ON_REQUEST = os.getenv('PROFILE_ON_REQUEST', '0') == '1'  # honour X-Profile: 1 / ?profile=1 from anyone
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN')  # when set, only X-Profile: <token> / ?profile=<token> counts
+PROFILE_HEADER = 'X-Profile'
+PROFILE_QUERY_FLAG = 'profile'
+MAX_PROFILES = int(os.getenv('MAX_PROFILES', 50))
+SORT_KEYS = frozenset(key.value for key in pstats.SortKey)
+
+# cProfile allows one active profiler per process, so concurrent requests take turns
+_active = threading.Lock()
+_index_lock = threading.Lock()
+
+
+def profile_dir():
+    # An artifact directory, so the storage sweeper ages out and caps saved profiles too
+    return artifacts.artifact_dir(artifacts.PROFILES)
+
+
+def _paths(profile_id):
+    directory = profile_dir()
+    return os.path.join(directory, f'{profile_id}.prof'), os.path.join(directory, f'{profile_id}.json')
+
+
+def is_profile_id(value):
+    return isinstance(value, str) and len(value) == 32 and all(c in '0123456789abcdef' for c in value)
+
+
+def _flag(headers, args):
+    return headers.get(PROFILE_HEADER) or args.get(PROFILE_QUERY_FLAG)
+
+
+def authorized(headers, args):
+    """Whether a request may ask for profiling and read saved profiles."""
+    flag = _flag(headers, args)
+    if flag is None:
+        return False
+    if PROFILE_TOKEN:
+        return hmac.compare_digest(flag.encode(), PROFILE_TOKEN.encode())
+    return PROFILE_ON_REQUEST and flag.lower() in ('1', 'true', 'yes')
+
+
+def requested(headers, args):
+    """Whether this request asked to be profiled, or was sampled."""
+    if authorized(headers, args):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def start():
+    """A running profiler, or None when another request is already being profiled."""
+    if not _active.acquire(blocking=False):
+        logging.info("Profiling skipped, another request is being profiled")
+        return None
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:  # another profiling tool (a debugger, coverage) holds the hook
+        _active.release()
+        return None
+    return profile
+
+
+def stop(profile, info):
+    """Stop `profile`, save it with `info` and return its id."""
+    profile.disable()
+    _active.release()
+
+    profile_id = uuid.uuid4().hex
+    prof_path, meta_path = _paths(profile_id)
+    profile.dump_stats(prof_path)
+    with open(meta_path, 'w') as f:
+        json.dump({'id': profile_id, 'created': time.time(), **info}, f)
+    _prune()
+    return profile_id
+
+
+def _prune():
+    with _index_lock:
+        for entry in list_profiles()[MAX_PROFILES:]:
+            for path in _paths(entry['id']):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def list_profiles():
+    """Saved profiles, newest first."""
+    entries = []
+    directory = profile_dir()
+    for name in os.listdir(directory):
+        if not name.endswith('.json') or not os.path.exists(os.path.join(directory, name[:-5] + '.prof')):
+            continue  # the sweeper may have taken the .prof first
+        try:
+            with open(os.path.join(directory, name), 'r') as f:
+                entries.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return sorted(entries, key=lambda entry: entry.get('created', 0), reverse=True)
+
+
+def profile_path(profile_id):
+    """The .prof file of a saved profile, or None."""
+    if not is_profile_id(profile_id):
+        return None
+    prof_path, _ = _paths(profile_id)
+    return prof_path if os.path.exists(prof_path) else None
+
+
+def summary(profile_id, sort='cumulative', limit=50):
+    """pstats text report of a saved profile. `sort` is one of SORT_KEYS."""
+    if sort not in SORT_KEYS:
+        raise ValueError(f"Unknown sort key: {sort!r}")
+    stream = io.StringIO()
+    stats = pstats.Stats(profile_path(profile_id), stream=stream)
+    stats.sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
+
+
+def init_app(app):
+    """
+    Profile requests that ask for it or are sampled.
+
+    Asking takes X-Profile: <PROFILE_TOKEN> (or ?profile=<PROFILE_TOKEN>),
+    or X-Profile: 1 when PROFILE_ON_REQUEST=1 and no token is configured.
+    """
+    from flask import g, request
+
+    @app.before_request
+    def _start_profile():
+        if request.path.startswith('/profiles'):
+            return  # reading profiles carries the token too; don't profile that
+        if requested(request.headers, request.args):
+            g.profile = start()
+            g.profile_started = time.perf_counter()
+
+    @app.after_request
+    def _save_profile(response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        info = {'method': request.method, 'path': request.path, 'status': response.status_code,
+                'duration': time.perf_counter() - g.pop('profile_started')}
+        try:
+            response.headers['X-Profile-Id'] = stop(profile, info)
+        except Exception as e:
+            logging.error(f"Failed to save profile: {str(e)}")
+        return response
+
+    @app.teardown_request
+    def _abandon_profile(exc):
+        # after_request is skipped on unhandled errors; never leave the profiler running
+        profile = g.pop('profile', None)
+        if profile is not None:
+            profile.disable()
+            _active.release()
@@ -0,0 +1,80 @@
+import time
+import logging
+import threading
+
+import render_cache
+import render_pool
+from render_pool import render_figure
+
+MAX_TRACKED_RENDERS = 1024
+
+_renders = {}
+_lock = threading.Lock()
+
+
+def _record(render_id, **fields):
+    with _lock:
+        entry = _renders.setdefault(render_id, {'created': time.time()})
+        entry.update(fields)
+
+        if len(_renders) > MAX_TRACKED_RENDERS:
+            finished = [key for key, value in _renders.items() if value['status'] != 'pending']
+            for key in sorted(finished, key=lambda key: _renders[key]['created'])[:len(_renders) - MAX_TRACKED_RENDERS]:
+                del _renders[key]
+
+
+def submit_full_render(func_name, explist, exptitles, plot_kwargs, version=None):
+    """
+    Start the full-quality render in the background and return its id.
+
+    The id is the render-cache key, so the finished image is served at the
+    stable URL /render-cache/<id>.png; poll status() until it is 'done'.
+    """
+    render_id, cached = render_cache.lookup(render_pool.get_renderer(func_name), explist, exptitles,
+                                            version=version, **plot_kwargs)
+    if cached is not None:
+        _record(render_id, status='done')
+        return render_id
+
+    with _lock:
+        if _renders.get(render_id, {}).get('status') == 'pending':
+            return render_id  # same render already in flight
+        if render_cache.is_pending(render_id):
+            return render_id  # in flight in another server worker
+        _renders[render_id] = {'created': time.time(), 'status': 'pending'}
+    render_cache.mark_pending(render_id)
+
+    def finish(future):
+        try:
+            render_cache.put(render_id, future.result())
+            _record(render_id, status='done', finished=time.time())
+            logging.info(f"Full-quality render {render_id} finished")
+        except Exception as e:
+            logging.error(f"Full-quality render {render_id} failed: {str(e)}")
+            _record(render_id, status='error', error=str(e))
+        finally:
+            render_cache.clear_pending(render_id)
+
+    render_pool.submit(render_figure, func_name, explist, exptitles, plot_kwargs).add_done_callback(finish)
+    return render_id
+
+
+def status(render_id):
+    with _lock:
+        entry = dict(_renders.get(render_id, {}))
+
+    if not entry:
+        # Rendered before a restart, or submitted to another server worker
+        if render_cache.get(render_id) is not None:
+            entry = {'status': 'done'}
+        elif render_cache.is_pending(render_id):
+            entry = {'status': 'pending'}
+        else:
+            return {'status': 'unknown'}
+
+    result = {'status': entry['status']}
+    if entry['status'] == 'done':
+        result['image'] = f'/render-cache/{render_id}.png'
+    if entry.get('error'):
+        result['error'] = entry['error']
+    return result
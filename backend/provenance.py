@@ -0,0 +1,50 @@
+import os
+import json
+import time
+import logging
+
+METADATA_SUFFIX = '.meta.json'
+
+
+def metadata_path(dataset_path):
+    """Sidecar file holding a dataset's metadata and processing history."""
+    return f"{dataset_path}{METADATA_SUFFIX}"
+
+
+def dataset_path_of(path):
+    """The dataset a sidecar belongs to, or None if `path` is not a sidecar."""
+    return path[:-len(METADATA_SUFFIX)] if path.endswith(METADATA_SUFFIX) else None
+
+
+def read(dataset_path):
+    """{'metadata': {...}, 'history': [...]} for a dataset; empty for datasets saved without one."""
+    try:
+        with open(metadata_path(dataset_path), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'metadata': {}, 'history': []}
+
+
+def step(name, **params):
+    """One processing history entry."""
+    return {'step': name, 'params': params, 'time': time.time()}
+
+
+def record(dataset_path, steps, parent=None, metadata=None):
+    """
+    Write the sidecar for `dataset_path`: the parent dataset's metadata and
+    history, updated with `metadata` and the `steps` that produced it.
+    """
+    info = read(parent) if parent else {'metadata': {}, 'history': []}
+    info['metadata'].update(metadata or {})
+    info['history'].extend(steps)
+
+    path = metadata_path(dataset_path)
+    try:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(info, f, default=str)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.error(f"Failed to write metadata for {dataset_path}: {str(e)}")
+    return info
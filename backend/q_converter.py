@@ -0,0 +1,128 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+HBAR_EV = 6.582119569e-16  # eV*s
+C = 299792458  # m/s
+M_E_EV = 0.5109989461e6 / (C**2)  # eV/(m/s)^2
+
+Q_AXIS_CACHE_SIZE = 256
+
+_q_axis_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def angle_to_q(angle, E0, E_loss):
+    if E_loss < 0 or angle < 0:
+        return np.nan
+
+    k0 = np.sqrt(2 * M_E_EV * E0) / (HBAR_EV * C)
+    k1 = np.sqrt(2 * M_E_EV * (E0 - E_loss)) / (HBAR_EV * C)
+
+    q = np.sqrt(k0**2 + k1**2 - 2*k0*k1*np.cos(angle))
+
+    return q  # Å^-1로 변환
+
+
+def angles_to_q(angles, E0, E_loss=0.0):
+    """
+    Vectorized angle_to_q. `angles` (radians) and `E_loss` broadcast against
+    each other, so a column vector of losses and a row of angles give the full
+    q(E_loss, angle) grid in one expression.
+    """
+    angles = np.asarray(angles, dtype=float)
+    E_loss = np.asarray(E_loss, dtype=float)
+
+    k0 = np.sqrt(2 * M_E_EV * E0) / (HBAR_EV * C)
+    with np.errstate(invalid='ignore'):
+        k1 = np.sqrt(2 * M_E_EV * (E0 - E_loss)) / (HBAR_EV * C)
+        q = np.sqrt(k0**2 + k1**2 - 2*k0*k1*np.cos(angles))
+
+    return np.where((E_loss < 0) | (angles < 0), np.nan, q)
+
+
+def process_q_values(q_values, debugging=False):
+    valid_q = q_values[~np.isnan(q_values) & ~np.isinf(q_values)]
+
+    if debugging:
+        print(f"Valid q values: {valid_q}")
+
+    if len(valid_q) == 0:
+        if debugging:
+            print("No valid q values found, returning original q_values")
+        return q_values
+
+    positive_q = valid_q[valid_q > 0]
+    if len(positive_q) == 0:
+        if debugging:
+            print("No positive q values found, returning original q_values")
+        return q_values
+
+    min_positive_q = np.min(positive_q)
+    q_step = np.min(np.diff(np.sort(valid_q)))
+
+    if debugging:
+        print(f"Minimum positive q: {min_positive_q}")
+        print(f"Calculated q_step: {q_step}")
+
+    if q_step > 0:
+        num_nan = np.sum(np.isnan(q_values))
+        negative_q = np.arange(0, -num_nan * q_step, -q_step)[::-1]
+
+        new_q_values = np.full_like(q_values, np.nan)
+        new_q_values[:len(negative_q)] = negative_q
+        new_q_values[len(negative_q):] = valid_q
+
+        if debugging:
+            print(f"Generated new_q_values (first 10): {new_q_values[:10]}")
+            print(f"Generated new_q_values (last 10): {new_q_values[-10:]}")
+
+        return new_q_values
+    else:
+        if debugging:
+            print("q_step is not positive, returning original q_values")
+        return q_values
+
+
+def axis_hash(values):
+    values = np.ascontiguousarray(values, dtype=float)
+    return hashlib.blake2b(values.tobytes(), digest_size=16).hexdigest()
+
+
+def convert_q_axis(angles, E0, E_loss=0.0, process=True):
+    """
+    Convert an angle axis (radians) to q at one fixed (scalar) energy loss.
+
+    Results are cached per (E0, angle-axis hash, E_loss, process) so every
+    spectrum sharing an elastic peak position reuses the same axis. With
+    `process=True` the NaN-padded negative side is filled in by
+    process_q_values, matching the original per-angle conversion.
+    """
+    key = (float(E0), axis_hash(angles), float(E_loss), bool(process))
+
+    with _lock:
+        cached = _q_axis_cache.get(key)
+        if cached is not None:
+            _q_axis_cache.move_to_end(key)
+            return cached
+
+    q_values = angles_to_q(angles, E0, E_loss)
+    if process:
+        q_values = process_q_values(q_values)
+    q_values.setflags(write=False)
+
+    with _lock:
+        _q_axis_cache[key] = q_values
+        if len(_q_axis_cache) > Q_AXIS_CACHE_SIZE:
+            _q_axis_cache.popitem(last=False)
+    logging.debug(f"Cached q axis for E0={E0}, {len(q_values)} points")
+
+    return q_values
+
+
+def clear_q_cache():
+    with _lock:
+        _q_axis_cache.clear()
@@ -0,0 +1,121 @@
+import logging
+from functools import lru_cache
+from io import BytesIO
+
+import numpy as np
+from matplotlib import colormaps
+from PIL import Image, ImageDraw, ImageFont
+
+BACKGROUND = (255, 255, 255)
+FOREGROUND = (0, 0, 0)
+
+
+@lru_cache(maxsize=32)
+def colormap_lut(cmap='inferno', size=256):
+    """(size, 3) uint8 RGB lookup table sampled from a matplotlib colormap."""
+    lut = colormaps[cmap](np.linspace(0, 1, size))[:, :3]
+    lut = (lut * 255).round().astype(np.uint8)
+    lut.setflags(write=False)
+    return lut
+
+
+def rasterize(Z, cmap='inferno', apply_log=True, vmin=None, vmax=None):
+    """
+    Map a 2D intensity matrix straight to an RGB array.
+
+    Rows are flipped so the first row ends up at the bottom, matching
+    imshow(origin='lower'). NaN pixels take the lowest colour.
+    """
+    Z = np.asarray(Z, dtype=float)
+    if apply_log:
+        Z = np.log1p(Z)
+
+    finite = np.isfinite(Z)
+    if not finite.any():
+        return np.zeros(Z.shape + (3,), dtype=np.uint8)
+
+    vmin = np.min(Z[finite]) if vmin is None else vmin
+    vmax = np.max(Z[finite]) if vmax is None else vmax
+    scale = 255.0 / (vmax - vmin) if vmax > vmin else 0.0
+
+    levels = np.where(finite, (Z - vmin) * scale, 0.0)
+    levels = np.clip(levels, 0, 255).astype(np.uint8)
+
+    return colormap_lut(cmap)[levels[::-1]]
+
+
+def _format_tick(value):
+    return f"{value:.3g}"
+
+
+def _draw_panel(canvas, rgb, origin, size, extent, title, num_ticks, font):
+    """Paste one heatmap at `origin` and draw a frame, ticks, labels and title."""
+    left, top = origin
+    width, height = size
+
+    image = Image.fromarray(rgb).resize((width, height), Image.NEAREST)
+    canvas.paste(image, (left, top))
+
+    draw = ImageDraw.Draw(canvas)
+    draw.rectangle([left - 1, top - 1, left + width, top + height], outline=FOREGROUND)
+
+    x_min, x_max, y_min, y_max = extent
+    for k in range(num_ticks):
+        fraction = k / (num_ticks - 1) if num_ticks > 1 else 0
+        x = left + round(fraction * (width - 1))
+        y = top + height - 1 - round(fraction * (height - 1))
+
+        draw.line([x, top + height, x, top + height + 4], fill=FOREGROUND)
+        draw.text((x, top + height + 6), _format_tick(x_min + fraction * (x_max - x_min)),
+                  fill=FOREGROUND, font=font, anchor='mt')
+
+        draw.line([left - 5, y, left - 1, y], fill=FOREGROUND)
+        draw.text((left - 7, y), _format_tick(y_min + fraction * (y_max - y_min)),
+                  fill=FOREGROUND, font=font, anchor='rm')
+
+    if title:
+        draw.text((left + width // 2, top - 6), title, fill=FOREGROUND, font=font, anchor='mb')
+
+
+def encode_image(image, fmt='png', quality=80, compress_level=1):
+    img_bytes = BytesIO()
+    if fmt == 'webp':
+        image.save(img_bytes, format='WEBP', quality=quality, method=0)
+    elif fmt in ('jpeg', 'jpg'):
+        image.save(img_bytes, format='JPEG', quality=quality)
+    elif fmt == 'png':
+        image.save(img_bytes, format='PNG', compress_level=compress_level)
+    else:
+        raise ValueError(f"Unsupported image format: {fmt}")
+    img_bytes.seek(0)
+    return img_bytes
+
+
+def render_preview_grid(panels, num_cols=2, panel_size=(360, 300), cmap='inferno', apply_log=False,
+                        num_ticks=5, fmt='png', num_panels=None):
+    """
+    Compose a grid of rasterized heatmaps without going through matplotlib.
+
+    `panels` are dicts with 'index' (grid position), 'Z', 'extent' and
+    'title'. Returns an encoded image as BytesIO.
+    """
+    if num_panels is None:
+        num_panels = max((panel['index'] for panel in panels), default=-1) + 1
+    num_rows = max((num_panels + num_cols - 1) // num_cols, 1)
+
+    font = ImageFont.load_default()
+    margin_left, margin_top, margin_right, margin_bottom = 56, 24, 16, 28
+    cell_width = margin_left + panel_size[0] + margin_right
+    cell_height = margin_top + panel_size[1] + margin_bottom
+
+    canvas = Image.new('RGB', (cell_width * num_cols, cell_height * num_rows), BACKGROUND)
+
+    for panel in panels:
+        row, col = divmod(panel['index'], num_cols)
+        origin = (col * cell_width + margin_left, row * cell_height + margin_top)
+        vmin, vmax = panel.get('clim', (None, None)) if not apply_log else (None, None)
+        rgb = rasterize(panel['Z'], cmap=cmap, apply_log=apply_log, vmin=vmin, vmax=vmax)
+        _draw_panel(canvas, rgb, origin, panel_size, panel['extent'], panel.get('title'), num_ticks, font)
+
+    logging.debug(f"Rasterized {len(panels)} preview panels into {canvas.size}")
+    return encode_image(canvas, fmt=fmt)
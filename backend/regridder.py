@@ -0,0 +1,116 @@
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from scipy import sparse
+
+from q_converter import axis_hash
+
+WEIGHTS_CACHE_SIZE = 64
+
+_weights_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def uniform_grid(axes, num_points=None):
+    """Build a uniform grid spanning every finite value in `axes`."""
+    finite = [np.asarray(axis, dtype=float) for axis in axes]
+    finite = [axis[np.isfinite(axis)] for axis in finite]
+    finite = [axis for axis in finite if axis.size]
+    if not finite:
+        raise ValueError("No finite axis values to build a grid from")
+
+    if num_points is None:
+        num_points = max(axis.size for axis in finite)
+
+    lo = min(axis.min() for axis in finite)
+    hi = max(axis.max() for axis in finite)
+    return np.linspace(lo, hi, int(num_points))
+
+
+def interpolation_weights(source_axis, target_grid):
+    """
+    Sparse (len(source_axis), len(target_grid)) matrix of linear interpolation
+    weights, so that `Z @ W` resamples the columns of Z onto target_grid.
+
+    Non-finite source points get no weight, and target points outside the
+    source range get an all-zero column; the second return value marks those
+    targets so callers can fill them with NaN. Matrices are cached per
+    (source axis, target grid) pair.
+    """
+    key = (axis_hash(source_axis), axis_hash(target_grid))
+    with _lock:
+        cached = _weights_cache.get(key)
+        if cached is not None:
+            _weights_cache.move_to_end(key)
+            return cached
+
+    source_axis = np.asarray(source_axis, dtype=float)
+    target_grid = np.asarray(target_grid, dtype=float)
+
+    valid = np.flatnonzero(np.isfinite(source_axis))
+    order = valid[np.argsort(source_axis[valid], kind='stable')]
+    xs = source_axis[order]
+
+    inside = np.zeros(target_grid.size, dtype=bool)
+    if xs.size >= 2:
+        inside = (target_grid >= xs[0]) & (target_grid <= xs[-1])
+    targets = np.flatnonzero(inside)
+
+    right = np.searchsorted(xs, target_grid[targets], side='right')
+    right = np.clip(right, 1, xs.size - 1) if xs.size >= 2 else right
+    left = right - 1
+
+    span = xs[right] - xs[left] if xs.size >= 2 else np.ones(0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frac = np.where(span > 0, (target_grid[targets] - xs[left]) / span, 0.0)
+
+    rows = np.concatenate([order[left], order[right]]) if targets.size else np.zeros(0, dtype=int)
+    cols = np.concatenate([targets, targets])
+    vals = np.concatenate([1.0 - frac, frac])
+
+    weights = sparse.csr_matrix((vals, (rows, cols)),
+                                shape=(source_axis.size, target_grid.size))
+    outside = ~inside
+
+    with _lock:
+        _weights_cache[key] = (weights, outside)
+        if len(_weights_cache) > WEIGHTS_CACHE_SIZE:
+            _weights_cache.popitem(last=False)
+    logging.debug(f"Built interpolation weights {weights.shape}, nnz={weights.nnz}")
+
+    return weights, outside
+
+
+def resample_stack(matrices, axes, target_grid):
+    """
+    Resample every matrix in `matrices` from its column axis onto target_grid.
+
+    Matrices that share a column axis (e.g. spectra with the same E0) are
+    stacked row-wise and resampled with a single sparse-matrix product.
+    """
+    resampled = [None] * len(matrices)
+
+    groups = OrderedDict()
+    for i, axis in enumerate(axes):
+        groups.setdefault(axis_hash(axis), []).append(i)
+
+    for members in groups.values():
+        weights, outside = interpolation_weights(axes[members[0]], target_grid)
+
+        blocks = [np.asarray(matrices[i], dtype=float) for i in members]
+        stacked = np.vstack(blocks)
+        result = np.asarray(stacked @ weights)
+        result[:, outside] = np.nan
+
+        bounds = np.cumsum([0] + [block.shape[0] for block in blocks])
+        for i, start, stop in zip(members, bounds[:-1], bounds[1:]):
+            resampled[i] = result[start:stop]
+
+    return resampled
+
+
+def clear_weights_cache():
+    with _lock:
+        _weights_cache.clear()
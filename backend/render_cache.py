@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import numpy as np
+
+from utils import delete_file
+
+RENDER_CACHE_DIR = os.getenv('RENDER_CACHE_DIR', 'render_cache')
+RENDER_CACHE_MAX_BYTES = int(os.getenv('RENDER_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+PENDING_EXT = 'pending'
+PENDING_TTL = float(os.getenv('RENDER_PENDING_TTL', 600))  # seconds before a marker counts as abandoned
+
+_lock = threading.Lock()
+_entries = None  # filename -> size, least recently used first
+_total_bytes = 0
+
+
+def cache_dir():
+    return os.path.abspath(RENDER_CACHE_DIR)
+
+
+def _hash_array(digest, values):
+    values = np.asarray(values)
+    if values.dtype == object:
+        values = values.astype(str)
+    digest.update(str(values.shape).encode())
+    digest.update(values.dtype.str.encode())
+    digest.update(np.ascontiguousarray(values).tobytes())
+
+
+def spectrum_version(df):
+    """Content hash of one spectrum: values, energy-loss index and columns."""
+    digest = hashlib.blake2b(digest_size=16)
+    _hash_array(digest, df.values)
+    _hash_array(digest, df.index)
+    _hash_array(digest, df.columns)
+    return digest.hexdigest()
+
+
+def dataset_version(explist):
+    digest = hashlib.blake2b(digest_size=16)
+    for df in explist:
+        digest.update(spectrum_version(df).encode())
+    return digest.hexdigest()
+
+
+def render_key(version, func_name, **params):
+    """Key a render by dataset version, renderer name and every plot parameter."""
+    payload = json.dumps({'version': version, 'func': func_name, 'params': params},
+                         sort_keys=True, default=repr)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=20).hexdigest()
+
+
+def _load_entries():
+    global _entries, _total_bytes
+
+    if _entries is not None:
+        return
+
+    directory = cache_dir()
+    os.makedirs(directory, exist_ok=True)
+
+    files = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path) and not name.endswith(f'.{PENDING_EXT}'):
+            stat = os.stat(path)
+            files.append((stat.st_mtime, name, stat.st_size))
+
+    _entries = OrderedDict((name, size) for _, name, size in sorted(files))
+    _total_bytes = sum(_entries.values())
+    logging.debug(f"Render cache loaded: {len(_entries)} entries, {_total_bytes} bytes")
+
+
+def cache_path(key, ext='png'):
+    return os.path.join(cache_dir(), f"{key}.{ext}")
+
+
+def get(key, ext='png'):
+    """Return cached image bytes for `key`, or None on a miss."""
+    global _total_bytes
+
+    name = f"{key}.{ext}"
+    path = cache_path(key, ext)
+    with _lock:
+        _load_entries()
+        if name in _entries:
+            _entries.move_to_end(name)
+        elif os.path.isfile(path):
+            # Written by another process (render worker or server worker)
+            size = os.path.getsize(path)
+            _entries[name] = size
+            _total_bytes += size
+        else:
+            return None
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        os.utime(path)  # keep on-disk order in step for the next restart
+        return data
+    except OSError:
+        with _lock:
+            _forget(name)
+        return None
+
+
+def put(key, data, ext='png'):
+    global _total_bytes
+
+    name = f"{key}.{ext}"
+    path = cache_path(key, ext)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    with _lock:
+        _load_entries()
+
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+    with _lock:
+        _forget(name)
+        _entries[name] = len(data)
+        _total_bytes += len(data)
+        _evict()
+
+    return path
+
+
+def mark_pending(key):
+    """Record, for every server worker, that the render for `key` is in flight."""
+    with _lock:
+        _load_entries()  # creates the cache directory
+    with open(cache_path(key, PENDING_EXT), 'w'):
+        pass
+
+
+def clear_pending(key):
+    try:
+        os.remove(cache_path(key, PENDING_EXT))
+    except OSError:
+        pass
+
+
+def is_pending(key):
+    """Whether some worker marked `key` as in flight within PENDING_TTL."""
+    try:
+        return time.time() - os.path.getmtime(cache_path(key, PENDING_EXT)) < PENDING_TTL
+    except OSError:
+        return False
+
+
+def _forget(name):
+    global _total_bytes
+    size = _entries.pop(name, None)
+    if size is not None:
+        _total_bytes -= size
+
+
+def _evict():
+    while _total_bytes > RENDER_CACHE_MAX_BYTES and len(_entries) > 1:
+        name = next(iter(_entries))
+        _forget(name)
+        delete_file(os.path.join(cache_dir(), name))
+
+
+def lookup(render_func, explist, exptitles, version=None, ext='png', **kwargs):
+    """Return (key, cached bytes or None) for a render without performing it."""
+    if version is None:
+        version = dataset_version(explist)
+    key = render_key(version, render_func.__name__, exptitles=list(exptitles), **kwargs)
+    return key, get(key, ext)
+
+
+def cached_render(render_func, explist, exptitles, version=None, ext='png', **kwargs):
+    """
+    Render through the cache.
+
+    Returns (key, image BytesIO). On a hit the stored image is returned
+    without calling render_func; on a miss the first element of the
+    renderer's result (or the result itself) is stored under the key.
+    """
+    key, data = lookup(render_func, explist, exptitles, version=version, ext=ext, **kwargs)
+    if data is not None:
+        logging.debug(f"Render cache hit for {render_func.__name__}: {key}")
+        return key, BytesIO(data)
+
+    result = render_func(explist, exptitles, **kwargs)
+    img_bytes = result[0] if isinstance(result, tuple) else result
+    put(key, img_bytes.getvalue(), ext)
+    img_bytes.seek(0)
+    logging.debug(f"Render cache miss for {render_func.__name__}: {key}")
+
+    return key, img_bytes
+
+
+def stats():
+    with _lock:
+        _load_entries()
+        return {'entries': len(_entries), 'bytes': _total_bytes, 'max_bytes': RENDER_CACHE_MAX_BYTES}
@@ -0,0 +1,92 @@
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', min(4, os.cpu_count() or 1)))
+
+_pool = None
+_lock = threading.Lock()
+
+
+def _init_worker():
+    # Pay the matplotlib/font-cache import cost once per worker, not per render
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot  # noqa: F401
+    import plotter  # noqa: F401
+    import profile_analyzer  # noqa: F401
+
+
+def _noop():
+    return os.getpid()
+
+
+def get_pool():
+    """The shared render pool, or None when RENDER_WORKERS is 0."""
+    global _pool
+
+    if RENDER_WORKERS <= 0:
+        return None
+
+    with _lock:
+        if _pool is None:
+            # spawn: forking a threaded Flask process with live matplotlib state is unsafe
+            context = multiprocessing.get_context('spawn')
+            _pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS, mp_context=context,
+                                        initializer=_init_worker)
+            logging.info(f"Started render pool with {RENDER_WORKERS} workers")
+        return _pool
+
+
+def start():
+    """Start the pool and wait until every worker has preloaded matplotlib."""
+    pool = get_pool()
+    if pool is not None:
+        list(pool.map(_noop, range(RENDER_WORKERS)))
+
+
+def shutdown(wait=True):
+    global _pool
+
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=wait, cancel_futures=True)
+            _pool = None
+            logging.info("Render pool shut down")
+
+
+def submit(func, *args, **kwargs):
+    """Run func in the pool; runs inline (still returning a Future) when the pool is disabled."""
+    pool = get_pool()
+    if pool is not None:
+        return pool.submit(func, *args, **kwargs)
+
+    future = Future()
+    try:
+        future.set_result(func(*args, **kwargs))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def get_renderer(func_name):
+    from plotter import create_plot, plot_data_with_q_conversion
+    return {'create_plot': create_plot, 'plot_data_with_q_conversion': plot_data_with_q_conversion}[func_name]
+
+
+def render_figure(func_name, explist, exptitles, kwargs):
+    """Worker task: render a grid figure and return the encoded image bytes."""
+    result = get_renderer(func_name)(explist, exptitles, **kwargs)
+    img_bytes = result[0] if isinstance(result, tuple) else result
+    return img_bytes.getvalue()
+
+
+def render_profile_data(explist, exptitles, profile_axis, method='mean'):
+    """Worker task: generate_profile_data with the image returned as bytes."""
+    from profile_analyzer import generate_profile_data
+
+    profile_data = generate_profile_data(explist, exptitles, profile_axis=profile_axis, method=method)
+    profile_data['image'] = profile_data['image'].getvalue()
+    return profile_data
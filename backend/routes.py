@@ -1,21 +1,36 @@
 import os
 import logging
 import traceback
-from flask import Blueprint, request, jsonify, session, send_file, make_response, abort
+from flask import Blueprint, request, jsonify, session, send_file, make_response, abort, Response, stream_with_context
 from werkzeug.utils import secure_filename
 from file_processor import get_sorted_files, load_and_store_data
-from plotter import shift_and_preview, plot_data_with_q_conversion
-from profile_analyzer import generate_profile_data, plot_intensity_profiles_with_heatmap
+from plotter import shift_and_preview, plot_data_with_q_conversion, convert_explist_to_q
+from profile_analyzer import generate_profile_data, generate_profile_arrays, generate_line_cut_data, plot_intensity_profiles_with_heatmap
+from array_payload import encode_records, parse_max_points
+import render_cache
+import render_pool
+import progressive
+import jobs
+from image_delivery import MIMETYPES as IMAGE_MIMETYPES, delivery_options, get_variant
+from render_cache import cached_render
+from tile_renderer import render_tile, render_tiled_grid
 from transformer import transform_data
 import uuid
 import json
-import pickle
-from utils import save_image, save_dataframe_to_file, load_dataframe_from_file
+import dataset_store
+import artifacts
+import storage_manager
+import side_writer
+import csv_export
+import binary_export
+import provenance
+import lifecycle
+import metrics
+import profiler
 import pandas as pd
 import base64
 import matplotlib.pyplot as plt
 from io import BytesIO
-import zipfile
 
 main_bp = Blueprint('main', __name__)
 
@@ -42,9 +57,124 @@ def save_uploaded_file(file, save_dir='uploads'):
     return file_path
 
 
+def _process_upload(file_paths, preview=False, progressive_mode=False, namespace=None, progress=None):
+    """
+    Parse, fit, shift, transform and render an uploaded directory.
+
+    Returns the /upload-directory response body. `progress` is a jobs.Job
+    when run in the background; artifacts are written under `namespace`.
+    """
+    if progress is not None:
+        progress.set_stage('parsing files')
+    sorted_file_paths = get_sorted_files(file_paths)
+    explist, exptitles = load_and_store_data(sorted_file_paths, progress=progress)
+
+    # Shift and preview processing
+    if progress is not None:
+        progress.set_stage('fitting spectra')
+    gauss_peak_x_mean, gauss_peak_y_mean, explist_shifted_gauss, _ = shift_and_preview(explist, exptitles, plot=False,
+                                                                                         namespace=namespace,
+                                                                                         progress=progress)
+
+    # If the shifted data is invalid or empty, use the original explist
+    if not explist_shifted_gauss or all(df.empty for df in explist_shifted_gauss):
+        logging.warning("No valid shifted data available. Using original explist.")
+        explist_shifted_gauss = explist  # Use the original data if the shifted data is not valid
+        skip_transformations = True
+    else:
+        skip_transformations = False
+
+    # Apply transformations to the data only if explist_shifted_gauss is valid
+    if progress is not None:
+        progress.set_stage('transforming')
+    if not skip_transformations:
+        explist_shifted_gauss = transform_data(explist_shifted_gauss, 'flip_lr')
+        explist_shifted_gauss = transform_data(explist_shifted_gauss, 'flip_ud')
+
+    # The three figures are independent: render them concurrently in the worker pool
+    if progress is not None:
+        progress.set_stage('rendering images')
+        progress.set_total('images_rendered', 3)
+    plot_kwargs = {'gauss_y': gauss_peak_y_mean, 'q_conversion': False, 'apply_log': True, 'preview': preview}
+
+    version = render_cache.dataset_version(explist_shifted_gauss)
+
+    if progressive_mode:
+        # Answer with a raster preview now; the full figure lands at a stable URL later
+        render_key, cached_image = cached_render(plot_data_with_q_conversion, explist_shifted_gauss, exptitles,
+                                                 version=version, **dict(plot_kwargs, preview=True))
+        render_id = progressive.submit_full_render('plot_data_with_q_conversion', explist_shifted_gauss,
+                                                   exptitles, dict(plot_kwargs, preview=False))
+    else:
+        render_id = None
+        render_key, cached_image = render_cache.lookup(plot_data_with_q_conversion, explist_shifted_gauss,
+                                                       exptitles, version=version, **plot_kwargs)
+    if cached_image is None:
+        main_future = render_pool.submit(render_pool.render_figure, 'plot_data_with_q_conversion',
+                                         explist_shifted_gauss, exptitles, plot_kwargs)
+
+    profile_futures = {}
+    profile_keys = {}
+    for axis in ('x', 'y'):
+        profile_keys[axis], cached_profile = render_cache.lookup(generate_profile_data, explist_shifted_gauss,
+                                                                 exptitles, version=version,
+                                                                 profile_axis=axis, method='mean')
+        if cached_profile is None:
+            profile_futures[axis] = render_pool.submit(render_pool.render_profile_data,
+                                                       explist_shifted_gauss, exptitles, axis)
+
+    # Save the transformed explist data
+    explist_path = dataset_store.save(explist_shifted_gauss, 'explist_shifted_gauss.pkl', namespace=namespace)
+    steps = [provenance.step('load_and_store_data', files=[os.path.basename(path) for path in sorted_file_paths]),
+             provenance.step('shift_and_preview')]
+    if not skip_transformations:
+        steps += [provenance.step('transform_data', action='flip_lr'), provenance.step('transform_data', action='flip_ud')]
+    provenance.record(explist_path, steps, metadata={
+        'titles': exptitles,
+        'axes': {'index': 'Loss Energy (eV)', 'columns': 'Angle (degree)'},
+        'gauss_peak_x_mean': gauss_peak_x_mean,
+        'gauss_peak_y_mean': gauss_peak_y_mean,
+    })
+
+    if cached_image is None:
+        with metrics.stage('render_wait'):
+            render_cache.put(render_key, main_future.result())
+    if progress is not None:
+        progress.advance('images_rendered')
+    img_url = f'/render-cache/{render_key}.png'
+
+    for axis in ('x', 'y'):
+        if axis in profile_futures:
+            with metrics.stage('render_wait'):
+                render_cache.put(profile_keys[axis], profile_futures[axis].result()['image'])
+        if progress is not None:
+            progress.advance('images_rendered')
+    x_profile_url = f"/render-cache/{profile_keys['x']}.png"
+    y_profile_url = f"/render-cache/{profile_keys['y']}.png"
+
+    # Prepare the response data
+    response_data = {
+        'image': img_url,
+        'gauss_peak_x_mean': gauss_peak_x_mean,
+        'gauss_peak_y_mean': gauss_peak_y_mean,
+        'filePaths': file_paths,
+        'explist_shifted_gauss': explist_path,
+        'exptitles': exptitles,
+        'latest_explist': explist_path,  # Return the latest explist path
+        'profiles': {
+            'x_profile': {'image': x_profile_url},
+            'y_profile': {'image': y_profile_url}
+        }
+    }
+    if render_id is not None:
+        response_data['render_id'] = render_id
+        response_data['full_image'] = f'/render-cache/{render_id}.png'
+        response_data['render_status'] = progressive.status(render_id)['status']
+    return response_data
+
+
 @main_bp.route('/upload-directory', methods=['POST'])
 def upload_directory():
-    SAVED_DATA_DIR = 'saved_data'
     try:
         if 'filePaths' not in request.files:
             logging.error("No files included in the request")
@@ -57,70 +187,47 @@ def upload_directory():
         
         logging.debug(f"Files received: {[file.filename for file in files]}")
 
+        # Each client gets its own directories so concurrent uploads never overwrite each other
+        namespace = artifacts.session_namespace()
+        save_dir = artifacts.artifact_dir(artifacts.SAVED_DATA, namespace)
+
         file_paths = []
         for file in files:
             filename = secure_filename(file.filename)
-            save_path = save_file_to_directory(file, SAVED_DATA_DIR, filename)
+            save_path = save_file_to_directory(file, save_dir, filename)
             file_paths.append(save_path)
 
-        sorted_file_paths = get_sorted_files(file_paths)
-        explist, exptitles = load_and_store_data(sorted_file_paths)
-
-        # Shift and preview processing
-        gauss_peak_x_mean, gauss_peak_y_mean, explist_shifted_gauss, _ = shift_and_preview(explist, exptitles, plot=False)
-
-        # If the shifted data is invalid or empty, use the original explist
-        if not explist_shifted_gauss or all(df.empty for df in explist_shifted_gauss):
-            logging.warning("No valid shifted data available. Using original explist.")
-            explist_shifted_gauss = explist  # Use the original data if the shifted data is not valid
-            skip_transformations = True
-        else:
-            skip_transformations = False
-
-        # Apply transformations to the data only if explist_shifted_gauss is valid
-        if not skip_transformations:
-            explist_shifted_gauss = transform_data(explist_shifted_gauss, 'flip_lr')
-            explist_shifted_gauss = transform_data(explist_shifted_gauss, 'flip_ud')
+        preview = request.form.get('preview', 'false').lower() == 'true'
+        progressive_mode = request.form.get('progressive', 'false').lower() == 'true'
 
-        # Generate the plot
-        img_bytes, _ = plot_data_with_q_conversion(explist_shifted_gauss, exptitles, gauss_peak_y_mean, q_conversion=False, apply_log=True)
-        img_url = save_image(img_bytes.getvalue(), 'output_plot.png')
+        if request.form.get('async', 'false').lower() == 'true':
+            # Files are on disk; the rest runs on a job worker and is polled via /jobs/<job_id>
+            job = jobs.submit('upload-directory', _process_upload, file_paths,
+                              preview=preview, progressive_mode=progressive_mode, namespace=namespace)
+            return jsonify({'job_id': job.id, 'status': job.status, 'status_url': f'/jobs/{job.id}'}), 202
 
-        # Save the transformed explist data
-        explist_path = save_dataframe_to_file(explist_shifted_gauss, 'explist_shifted_gauss.pkl')
-        session['explist_path'] = explist_path
-        session['exptitles'] = exptitles
-        session['gauss_peak_y_mean'] = gauss_peak_y_mean
-        session['latest_explist'] = explist_path  # Store the latest explist path
+        response_data = _process_upload(file_paths, preview=preview, progressive_mode=progressive_mode,
+                                        namespace=namespace)
 
-        # Generate profile data
-        x_profile_data = generate_profile_data(explist_shifted_gauss, exptitles, profile_axis='x')
-        y_profile_data = generate_profile_data(explist_shifted_gauss, exptitles, profile_axis='y')
+        session['explist_path'] = response_data['explist_shifted_gauss']
+        session['exptitles'] = response_data['exptitles']
+        session['gauss_peak_y_mean'] = response_data['gauss_peak_y_mean']
+        session['latest_explist'] = response_data['latest_explist']  # Store the latest explist path
 
-        # Save profile plots
-        x_profile_url = save_image(x_profile_data['image'].getvalue(), 'x_profile_plot.png')
-        y_profile_url = save_image(y_profile_data['image'].getvalue(), 'y_profile_plot.png')
-
-        # Prepare the response data
-        response_data = {
-            'image': img_url,
-            'gauss_peak_x_mean': gauss_peak_x_mean,
-            'gauss_peak_y_mean': gauss_peak_y_mean,
-            'filePaths': file_paths,
-            'explist_shifted_gauss': explist_path,
-            'exptitles': exptitles,
-            'latest_explist': explist_path,  # Return the latest explist path
-            'profiles': {
-                'x_profile': {'image': x_profile_url},
-                'y_profile': {'image': y_profile_url}
-            }
-        }
         return jsonify(response_data)
 
     except Exception as e:
         logging.error(f"Error in upload_directory: {str(e)}")
         logging.error(traceback.format_exc())
         return jsonify({'error': f'Server error: {str(e)}', 'traceback': traceback.format_exc()}), 500
+
+
+@main_bp.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Unknown job {job_id}'}), 404
+    return jsonify(job.to_dict())
     
 
 @main_bp.route('/q-energyloss', methods=['POST'])
@@ -148,16 +255,54 @@ def q_energy_loss():
             logging.error("Missing data for Q-Loss Energy transformation")
             return jsonify({'error': 'Missing data for Q-Loss Energy transformation'}), 400
 
-        explist_data = load_dataframe_from_file(explist_path)
+        explist_data = dataset_store.load(explist_path)
 
         if explist_data is None:
             logging.error(f"Failed to load file from {explist_path}")
             return jsonify({'error': f'Failed to load explist data from {explist_path}'}), 500
 
-        q_plot_bytes, transformed_explist = plot_data_with_q_conversion(explist_data, exptitles, gauss_peak_y_mean, q_conversion=True, apply_log=True)
-        q_plot_url = save_image(q_plot_bytes.getvalue(), 'q_output_plot.png')
-
-        transformed_explist_path = save_dataframe_to_file(transformed_explist, 'explist_q_converted.pkl')
+        regrid = data.get('regrid', False)
+        q_grid_points = data.get('q_grid_points')
+        plot_kwargs = {'gauss_y': gauss_peak_y_mean, 'q_conversion': True, 'apply_log': True,
+                       'regrid': regrid, 'q_grid_points': q_grid_points}
+        version = render_cache.dataset_version(explist_data)
+
+        # The converted dataset is named after everything it depends on, so a repeat request reuses it
+        conversion_key = render_cache.render_key(version, 'convert_explist_to_q', gauss_y=gauss_peak_y_mean,
+                                                 apply_log=True, regrid=regrid, q_grid_points=q_grid_points)
+        namespace = artifacts.request_namespace(explist_path)
+        transformed_filename = f'explist_q_converted_{conversion_key}.pkl'
+        transformed_explist_path = os.path.join(artifacts.artifact_dir(artifacts.SAVED_DATA, namespace),
+                                                transformed_filename)
+        transformed_explist = None
+        converted_exists = os.path.exists(transformed_explist_path)
+
+        progressive_mode = data.get('progressive', False)
+        preview = True if progressive_mode else data.get('preview', False)
+        render_kwargs = dict(plot_kwargs, preview=preview)
+        render_key, cached_image = render_cache.lookup(plot_data_with_q_conversion, explist_data, exptitles,
+                                                       version=version, **render_kwargs)
+        if cached_image is None:
+            # The render converts anyway: keep its converted explist rather than converting twice
+            img_bytes, transformed_explist = plot_data_with_q_conversion(explist_data, exptitles, **render_kwargs)
+            render_cache.put(render_key, img_bytes.getvalue())
+
+        render_id = None
+        if progressive_mode:
+            render_id = progressive.submit_full_render('plot_data_with_q_conversion', explist_data, exptitles,
+                                                       dict(plot_kwargs, preview=False), version=version)
+        q_plot_url = f'/render-cache/{render_key}.png'
+
+        if not converted_exists:
+            if transformed_explist is None:
+                transformed_explist = convert_explist_to_q(explist_data, exptitles, gauss_peak_y_mean, apply_log=True,
+                                                           regrid=regrid, q_grid_points=q_grid_points)
+            dataset_store.save(transformed_explist, transformed_filename, namespace=namespace)
+            provenance.record(transformed_explist_path,
+                              [provenance.step('convert_explist_to_q', gauss_y=gauss_peak_y_mean, apply_log=True,
+                                               regrid=regrid, q_grid_points=q_grid_points)],
+                              parent=explist_path,
+                              metadata={'titles': exptitles, 'axes': {'index': 'Loss Energy (eV)', 'columns': 'q (Å⁻¹)'}})
         session['explist_path'] = transformed_explist_path
         session['latest_explist'] = transformed_explist_path  # Store the latest explist path
 
@@ -168,6 +313,10 @@ def q_energy_loss():
             'latest_explist': transformed_explist_path,
             'exptitles': exptitles
         }
+        if render_id is not None:
+            response_data['render_id'] = render_id
+            response_data['full_image'] = f'/render-cache/{render_id}.png'
+            response_data['render_status'] = progressive.status(render_id)['status']
 
         return jsonify(response_data)
 
@@ -202,10 +351,12 @@ def transform():
         # Generate a unique filename using UUID
         unique_id = uuid.uuid4()
         transformed_filename = f'transformed_explist_{action}_{unique_id}.pkl'
-        transformed_explist_path = os.path.join(os.path.dirname(explist_path), transformed_filename)
+        namespace = artifacts.request_namespace(explist_path)
+        transformed_explist_path = os.path.join(artifacts.artifact_dir(artifacts.SAVED_DATA, namespace),
+                                                transformed_filename)
 
         # Load explist data from the original file
-        explist_data = load_dataframe_from_file(explist_path)
+        explist_data = dataset_store.load(explist_path)
         if explist_data is None:
             logging.error(f"Failed to load file from {explist_path}")
             return jsonify({'error': f'Failed to load explist data from {explist_path}'}), 500
@@ -214,20 +365,28 @@ def transform():
 
         transformed_explist = transform_data(explist_data, action)
         
-        save_dataframe_to_file(transformed_explist, transformed_explist_path)
+        dataset_store.save(transformed_explist, transformed_explist_path)
+        metadata = {}
+        if action in ('rotate_ccw90', 'rotate_cw90'):
+            axes = provenance.read(explist_path)['metadata'].get('axes', {})
+            metadata['axes'] = {'index': axes.get('columns'), 'columns': axes.get('index')}
+        provenance.record(transformed_explist_path, [provenance.step('transform_data', action=action)],
+                          parent=explist_path, metadata=metadata)
         logging.info(f"Transformed data saved to: {transformed_explist_path}")
 
-        img_bytes, _ = plot_data_with_q_conversion(transformed_explist, data.get('exptitles', []), apply_log=False, q_conversion=False)
-        
-        # Convert BytesIO image data to Base64
-        img_bytes.seek(0)
-        img_base64 = base64.b64encode(img_bytes.getvalue()).decode('utf-8')
+        render_key, img_bytes = cached_render(plot_data_with_q_conversion, transformed_explist,
+                                              data.get('exptitles', []), apply_log=False, q_conversion=False)
 
         # Store the path of the transformed explist in the session
         session['explist_path'] = transformed_explist_path
         session['latest_explist'] = transformed_explist_path  # Store the latest explist path
 
-        return jsonify({'success': True, 'image': img_base64, 'explist_path': transformed_explist_path, 'latest_explist': transformed_explist_path})
+        response_data = {'success': True, 'image': f'/render-cache/{render_key}.png',
+                         'explist_path': transformed_explist_path, 'latest_explist': transformed_explist_path}
+        if data.get('image_delivery') == 'base64':
+            # Legacy clients that still expect the PNG inlined in the JSON
+            response_data['image'] = base64.b64encode(img_bytes.getvalue()).decode('utf-8')
+        return jsonify(response_data)
 
         # Update the transformed data in the store
         if is_q_energy_loss_enabled:
@@ -255,24 +414,27 @@ def export_csv_files():
         if not explist_path or not exptitles:
             return jsonify({'error': 'Missing explist path or exptitles in request'}), 400
 
-        # Load the explist data from the file
-        with open(explist_path, 'rb') as f:
-            explist = pickle.load(f)
+        explist = dataset_store.load(explist_path)
+        if explist is None:
+            return jsonify({'error': f'Failed to load explist data from {explist_path}'}), 500
 
         if len(explist) != len(exptitles):
             return jsonify({'error': 'Explist data length does not match exptitles'}), 400
 
-        output_dir = os.path.join('exports', 'csv_files')
-        os.makedirs(output_dir, exist_ok=True)
+        namespace = artifacts.request_namespace(explist_path)
+        output_dir = os.path.relpath(artifacts.artifact_dir(artifacts.CSV_EXPORTS, namespace))
 
         saved_files = []
+        download_urls = []
         for i, df in enumerate(explist):
             file_name = f'{exptitles[i]}.csv'
             file_path = os.path.join(output_dir, file_name)
             df.to_csv(file_path, index=False)
             saved_files.append(file_path)
+            download_urls.append(f'/download/{namespace}/{file_name}')
 
-        return jsonify({'message': 'All CSV files were successfully saved.', 'files': saved_files})
+        return jsonify({'message': 'All CSV files were successfully saved.', 'files': saved_files,
+                        'urls': download_urls})
 
     except Exception as e:
         logging.error(f"Error in export_csv_files: {str(e)}")
@@ -280,10 +442,107 @@ def export_csv_files():
         return jsonify({'error': f'Server error: {str(e)}', 'traceback': traceback.format_exc()}), 500
 
 
+@main_bp.route('/export-zip', methods=['POST'])
+def export_zip():
+    try:
+        data = request.json
+        explist_path = data.get('latest_explist')
+        exptitles = data.get('exptitles', [])
+
+        if not explist_path or not exptitles:
+            return jsonify({'error': 'Missing explist path or exptitles in request'}), 400
+
+        explist = dataset_store.load(explist_path)
+        if explist is None:
+            return jsonify({'error': f'Failed to load explist data from {explist_path}'}), 500
+
+        if len(explist) != len(exptitles):
+            return jsonify({'error': 'Explist data length does not match exptitles'}), 400
+
+        header = data.get('header', True)
+        if not isinstance(header, (bool, list)):
+            return jsonify({'error': 'header must be true, false or a list of column names'}), 400
+
+        csv_options = {
+            'x_min': data.get('x_min'),
+            'x_max': data.get('x_max'),
+            'y_min': data.get('y_min'),
+            'y_max': data.get('y_max'),
+            'header': header,
+            'index': bool(data.get('include_index', True)),
+            'index_label': data.get('index_label', 'Loss Energy (eV)'),
+            'float_format': data.get('float_format'),
+            'sep': data.get('sep', ','),
+        }
+        compress_level = int(data.get('compress_level', 6))
+        if not 0 <= compress_level <= 9:
+            return jsonify({'error': 'compress_level must be between 0 and 9'}), 400
+        try:
+            csv_export.check_csv_options(explist, **csv_options)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        archive_name = secure_filename(data.get('filename') or 'csv_export') or 'csv_export'
+        if not archive_name.endswith('.zip'):
+            archive_name += '.zip'
+
+        stream = csv_export.stream_zip(explist, [secure_filename(title) or f'spectrum_{i}' for i, title in enumerate(exptitles)],
+                                       compress_level=compress_level, **csv_options)
+        return Response(stream_with_context(stream), mimetype='application/zip',
+                        headers={'Content-Disposition': f'attachment; filename="{archive_name}"'})
+
+    except Exception as e:
+        logging.error(f"Error in export_zip: {str(e)}")
+        logging.error(traceback.format_exc())
+        return jsonify({'error': f'Server error: {str(e)}', 'traceback': traceback.format_exc()}), 500
+
+
+@main_bp.route('/export-binary', methods=['POST'])
+def export_binary():
+    try:
+        data = request.json
+        explist_path = data.get('latest_explist')
+        exptitles = data.get('exptitles', [])
+        fmt = data.get('format', 'npz')
+
+        if not explist_path or not exptitles:
+            return jsonify({'error': 'Missing explist path or exptitles in request'}), 400
+        if fmt not in binary_export.MIMETYPES:
+            return jsonify({'error': f'Unsupported export format: {fmt}'}), 400
+        if fmt == 'parquet' and not binary_export.parquet_available():
+            return jsonify({'error': 'Parquet export requires pyarrow, which is not installed on the server'}), 501
+
+        explist = dataset_store.load(explist_path)
+        if explist is None:
+            return jsonify({'error': f'Failed to load explist data from {explist_path}'}), 500
+
+        if len(explist) != len(exptitles):
+            return jsonify({'error': 'Explist data length does not match exptitles'}), 400
+
+        info = provenance.read(explist_path)
+        info['metadata']['titles'] = exptitles
+        if fmt == 'npz':
+            buffer = binary_export.to_npz(explist, exptitles, info, compressed=bool(data.get('compressed', False)))
+        else:
+            buffer = binary_export.to_parquet(explist, exptitles, info)
+
+        archive_name = secure_filename(data.get('filename') or 'explist') or 'explist'
+        return send_file(buffer, mimetype=binary_export.MIMETYPES[fmt], as_attachment=True,
+                         download_name=f'{archive_name}.{fmt}')
+
+    except Exception as e:
+        logging.error(f"Error in export_binary: {str(e)}")
+        logging.error(traceback.format_exc())
+        return jsonify({'error': f'Server error: {str(e)}', 'traceback': traceback.format_exc()}), 500
+
+
 @main_bp.route('/download/<filename>', methods=['GET'])
-def download_file(filename):
+@main_bp.route('/download/<namespace>/<filename>', methods=['GET'])
+def download_file(filename, namespace=None):
+    if namespace is not None and not artifacts.is_namespace(namespace):
+        abort(404)
     try:
-        directory = os.path.abspath('exports/csv_files')
+        directory = artifacts.artifact_dir(artifacts.CSV_EXPORTS, namespace, create=False)
         file_path = os.path.join(directory, filename)
 
         if not os.path.commonpath([file_path, directory]) == directory or not os.path.isfile(file_path):
@@ -296,26 +555,274 @@ def download_file(filename):
         return jsonify({'error': f'Failed to download file: {str(e)}'}), 500
 
 
+def _image_response(key, fmt='png'):
+    """Serve a cached render in the format requested by ?format/quality/compress_level, with ETag support."""
+    try:
+        fmt, quality, compress_level = delivery_options(request.args, fmt)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    etag, data = get_variant(key, fmt, quality, compress_level)
+    if data is None:
+        abort(404)
+
+    response = make_response(data)
+    response.mimetype = IMAGE_MIMETYPES[fmt]
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 31536000  # keys are content hashes, so images never change
+    return response.make_conditional(request)
+
+
+@main_bp.route('/render-cache/<filename>', methods=['GET'])
+def serve_cached_render(filename):
+    key, ext = os.path.splitext(secure_filename(filename))
+    return _image_response(key, ext.lstrip('.') or 'png')
+
+
+@main_bp.route('/dataset-store/stats', methods=['GET'])
+def dataset_store_stats():
+    return jsonify(dataset_store.stats())
+
+
+@main_bp.route('/storage/stats', methods=['GET'])
+def storage_stats():
+    return jsonify(storage_manager.stats())
+
+
+@main_bp.route('/storage/sweep', methods=['POST'])
+def storage_sweep():
+    try:
+        return jsonify(storage_manager.sweep())
+    except Exception as e:
+        logging.error(f"Error in storage_sweep: {str(e)}")
+        logging.error(traceback.format_exc())
+        return jsonify({'error': f'Server error: {str(e)}', 'traceback': traceback.format_exc()}), 500
+
+
+@main_bp.route('/side-output/status', methods=['GET'])
+def side_output_status():
+    return jsonify(side_writer.status())
+
+
+@main_bp.route('/side-output/flush', methods=['POST'])
+def side_output_flush():
+    timeout = request.args.get('timeout', type=float)
+    flushed = side_writer.flush(timeout)
+    return jsonify({'flushed': flushed, **side_writer.status()})
+
+
+@main_bp.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    response = make_response(metrics.render())
+    response.mimetype = 'text/plain; version=0.0.4'
+    return response
+
+
+@main_bp.route('/profiles', methods=['GET'])
+def list_profiles():
+    if not profiler.authorized(request.headers, request.args):
+        return jsonify({'error': 'Profiling is not enabled for this request'}), 403
+    return jsonify({'profiles': profiler.list_profiles()})
+
+
+@main_bp.route('/profiles/<profile_id>', methods=['GET'])
+def download_profile(profile_id):
+    if not profiler.authorized(request.headers, request.args):
+        return jsonify({'error': 'Profiling is not enabled for this request'}), 403
+
+    path = profiler.profile_path(profile_id)
+    if path is None:
+        return jsonify({'error': f'Profile not found: {profile_id}'}), 404
+
+    sort = request.args.get('sort', 'cumulative')
+    if sort not in profiler.SORT_KEYS:
+        return jsonify({'error': f"Invalid sort: {sort}. Use one of {', '.join(sorted(profiler.SORT_KEYS))}"}), 400
+
+    try:
+        if request.args.get('format') == 'text':
+            response = make_response(profiler.summary(profile_id, sort=sort))
+            response.mimetype = 'text/plain'
+            return response
+        return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                         download_name=f'{profile_id}.prof')
+
+    except Exception as e:
+        logging.error(f"Error in download_profile: {str(e)}")
+        logging.error(traceback.format_exc())
+        return jsonify({'error': f'Server error: {str(e)}', 'traceback': traceback.format_exc()}), 500
+
+
+@main_bp.route('/healthz', methods=['GET'])
+def healthz():
+    return jsonify(lifecycle.health())
+
+
+@main_bp.route('/readyz', methods=['GET'])
+def readyz():
+    ready, checks = lifecycle.readiness()
+    return jsonify({'ready': ready, 'checks': checks}), 200 if ready else 503
+
+
+@main_bp.route('/render-status/<render_id>', methods=['GET'])
+def render_status(render_id):
+    return jsonify(progressive.status(secure_filename(render_id)))
+
+
 @main_bp.route('/plot_intensity_profiles', methods=['POST'])
 def plot_intensity_profiles():
-    data = request.json
-    
-    x_min = float(data.get('x_min', None))
-    x_max = float(data.get('x_max', None))
-    y_min = float(data.get('y_min', None))
-    y_max = float(data.get('y_max', None))
+    try:
+        data = request.json or {}
 
-    """
-    img_bytes = plot_intensity_profiles_with_heatmap(
-        explist, exptitles,
-        value=75, window_size=5, plot='x',
-        aggregation='mean',
-        x_min=x_min, x_max=x_max, y_min=y_min, y_max=y_max,
-        q_conversion=False, apply_log=True,
-        figsize=(5, 5),
-        width_ratio=(3.5, 1),
-        hide_ticks=True,
-    )
-
-    return send_file(img_bytes, mimetype='image/png')
-    """
\ No newline at end of file
+        explist_path = data.get('latest_explist')
+        exptitles = data.get('exptitles', [])
+
+        if not explist_path or not exptitles:
+            return jsonify({'error': 'Missing explist path or exptitles in request'}), 400
+
+        def optional_float(name):
+            value = data.get(name)
+            return float(value) if value is not None else None
+
+        explist = dataset_store.load(explist_path)
+        if explist is None:
+            logging.error(f"Failed to load file from {explist_path}")
+            return jsonify({'error': f'Failed to load explist data from {explist_path}'}), 500
+
+        # Cached integral images stay valid until the explist file is rewritten
+        dataset_key = (os.path.abspath(explist_path), os.path.getmtime(explist_path))
+
+        line_cuts = generate_line_cut_data(
+            explist, exptitles,
+            gauss_y=data.get('gauss_peak_y_mean'),
+            value=float(data.get('value', 75)),
+            window_size=float(data.get('window_size', 0)),
+            plot=data.get('plot', 'x'),
+            aggregation=data.get('aggregation', 'mean'),
+            x_min=optional_float('x_min'), x_max=optional_float('x_max'),
+            y_min=optional_float('y_min'), y_max=optional_float('y_max'),
+            q_conversion=data.get('q_conversion', False),
+            dataset_key=dataset_key,
+            max_points=parse_max_points(data.get('max_points')),
+        )
+
+        return encode_records(line_cuts, ('axis', 'intensity'), fmt=data.get('format', 'json'),
+                              extra={'plot': data.get('plot', 'x')}, key='profiles')
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error in plot_intensity_profiles: {str(e)}")
+        logging.error(traceback.format_exc())
+        return jsonify({'error': f'Server error: {str(e)}', 'traceback': traceback.format_exc()}), 500
+
+
+@main_bp.route('/profile-data', methods=['POST'])
+def profile_data():
+    try:
+        data = request.json or {}
+
+        explist_path = data.get('latest_explist')
+        exptitles = data.get('exptitles', [])
+        profile_axis = data.get('profile_axis', 'x')
+
+        if not explist_path or not exptitles:
+            return jsonify({'error': 'Missing explist path or exptitles in request'}), 400
+
+        if profile_axis not in ('x', 'y'):
+            return jsonify({'error': "profile_axis must be 'x' or 'y'"}), 400
+
+        explist = dataset_store.load(explist_path)
+        if explist is None:
+            logging.error(f"Failed to load file from {explist_path}")
+            return jsonify({'error': f'Failed to load explist data from {explist_path}'}), 500
+
+        records = generate_profile_arrays(
+            explist, exptitles, profile_axis,
+            method=data.get('method', 'mean'),
+            fit_function=data.get('fit_function', 'gauss'),
+            max_points=parse_max_points(data.get('max_points')),
+        )
+
+        return encode_records(records, ('x', 'y', 'fit'), fmt=data.get('format', 'json'),
+                              extra={'profile_axis': profile_axis}, key='profiles')
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error in profile_data: {str(e)}")
+        logging.error(traceback.format_exc())
+        return jsonify({'error': f'Server error: {str(e)}', 'traceback': traceback.format_exc()}), 500
+
+
+def _tile_plot_kwargs(data):
+    return {
+        'q_conversion': data.get('q_conversion', False),
+        'apply_log': data.get('apply_log', True),
+        'preview': data.get('preview', False),
+    }
+
+
+@main_bp.route('/tile', methods=['POST'])
+def tile():
+    try:
+        data = request.json or {}
+
+        explist_path = data.get('latest_explist')
+        exptitles = data.get('exptitles', [])
+        index = data.get('index')
+
+        if not explist_path or not exptitles or index is None:
+            return jsonify({'error': 'Missing explist path, exptitles or index in request'}), 400
+
+        explist = dataset_store.load(explist_path)
+        if explist is None:
+            return jsonify({'error': f'Failed to load explist data from {explist_path}'}), 500
+
+        index = int(index)
+        if not 0 <= index < min(len(explist), len(exptitles)):
+            return jsonify({'error': f'Tile index {index} out of range'}), 400
+
+        gauss_y = data.get('gauss_peak_y_mean')
+        E0 = gauss_y[index] if gauss_y is not None and data.get('q_conversion', False) else None
+
+        key = render_tile(explist[index], exptitles[index], E0, **_tile_plot_kwargs(data))
+        return _image_response(key)
+
+    except Exception as e:
+        logging.error(f"Error in tile: {str(e)}")
+        logging.error(traceback.format_exc())
+        return jsonify({'error': f'Server error: {str(e)}', 'traceback': traceback.format_exc()}), 500
+
+
+@main_bp.route('/tiled-plot', methods=['POST'])
+def tiled_plot():
+    try:
+        data = request.json or {}
+
+        explist_path = data.get('latest_explist')
+        exptitles = data.get('exptitles', [])
+
+        if not explist_path or not exptitles:
+            return jsonify({'error': 'Missing explist path or exptitles in request'}), 400
+
+        explist = dataset_store.load(explist_path)
+        if explist is None:
+            return jsonify({'error': f'Failed to load explist data from {explist_path}'}), 500
+
+        gauss_y = data.get('gauss_peak_y_mean') if data.get('q_conversion', False) else None
+        grid_key, tile_keys = render_tiled_grid(explist, exptitles, gauss_y=gauss_y,
+                                                num_cols=int(data.get('num_cols', 2)),
+                                                executor=render_pool.get_pool(),
+                                                **_tile_plot_kwargs(data))
+
+        return jsonify({
+            'success': True,
+            'image': f'/render-cache/{grid_key}.png',
+            'tiles': [f'/render-cache/{key}.png' for key in tile_keys],
+        })
+
+    except Exception as e:
+        logging.error(f"Error in tiled_plot: {str(e)}")
+        logging.error(traceback.format_exc())
+        return jsonify({'error': f'Server error: {str(e)}', 'traceback': traceback.format_exc()}), 500
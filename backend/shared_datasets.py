@@ -0,0 +1,107 @@
+import os
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+SHARED_DATASETS = os.getenv('SHARED_DATASETS', '0') == '1'  # on in multi-worker serving (gunicorn.conf.py)
+
+VALUES_SUFFIX = '.values.npy'
+AXES_SUFFIX = '.axes.npz'
+SUFFIXES = (VALUES_SUFFIX, AXES_SUFFIX)
+
+
+def dataset_path_of(path):
+    """The dataset a memory-mapped companion file belongs to, or None."""
+    for suffix in SUFFIXES:
+        if path.endswith(suffix):
+            return path[:-len(suffix)]
+    return None
+
+
+def _is_numeric_explist(data):
+    return (isinstance(data, list) and data and all(isinstance(df, pd.DataFrame) for df in data)
+            and all(pd.api.types.is_numeric_dtype(df.index) and pd.api.types.is_numeric_dtype(df.columns)
+                    and all(pd.api.types.is_numeric_dtype(dtype) for dtype in df.dtypes) for df in data))
+
+
+def publish(dataset_path, data):
+    """
+    Write an explist next to its pickle in a layout every server worker can
+    memory-map: all values in one flat float64 .npy, axes and shapes in a
+    small .npz. Returns False for data that is not a numeric explist.
+    """
+    if not SHARED_DATASETS or not _is_numeric_explist(data):
+        return False
+
+    values_path = dataset_path + VALUES_SUFFIX
+    axes_path = dataset_path + AXES_SUFFIX
+    # Per writer: workers that first-load the same pickle at once must not truncate each other's files
+    tmp_suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+    values_tmp = values_path + tmp_suffix
+    axes_tmp = axes_path + tmp_suffix
+    shapes = np.array([df.shape for df in data], dtype=np.int64)
+    axes = {}
+    for i, df in enumerate(data):
+        axes[f'index_{i}'] = df.index.to_numpy()
+        axes[f'columns_{i}'] = df.columns.to_numpy()
+
+    try:
+        with metrics.stage('publish_shared_dataset', spectra=len(data)) as timing:
+            # Values first, axes last: the axes file (stamped with the pickle's mtime) marks a complete publish
+            values = np.lib.format.open_memmap(values_tmp, mode='w+', dtype=np.float64,
+                                               shape=(int(np.prod(shapes, axis=1).sum()),))
+            offset = 0
+            for df in data:
+                size = df.size
+                values[offset:offset + size] = df.to_numpy(dtype=np.float64).ravel()
+                offset += size
+            values.flush()
+            timing.add(nbytes=values.nbytes)
+            del values
+            os.replace(values_tmp, values_path)
+
+            with open(axes_tmp, 'wb') as f:
+                np.savez(f, shapes=shapes, source_mtime=np.array(os.path.getmtime(dataset_path)), **axes)
+            os.replace(axes_tmp, axes_path)
+        return True
+    except OSError as e:
+        logging.error(f"Failed to publish shared dataset {dataset_path}: {str(e)}")
+        for path in (values_tmp, axes_tmp):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return False
+
+
+def open_shared(dataset_path):
+    """
+    The explist published for `dataset_path`, as read-only DataFrames over
+    one shared memory map, or None when there is no up-to-date publish.
+    """
+    if not SHARED_DATASETS:
+        return None
+
+    try:
+        with np.load(dataset_path + AXES_SUFFIX) as axes:
+            if float(axes['source_mtime']) != os.path.getmtime(dataset_path):
+                return None  # the pickle was rewritten since
+            shapes = axes['shapes']
+            index = [axes[f'index_{i}'] for i in range(len(shapes))]
+            columns = [axes[f'columns_{i}'] for i in range(len(shapes))]
+        values = np.load(dataset_path + VALUES_SUFFIX, mmap_mode='r')
+    except (OSError, KeyError, ValueError):
+        return None
+
+    explist = []
+    offset = 0
+    for (rows, cols), idx, cols_axis in zip(shapes, index, columns):
+        size = int(rows * cols)
+        block = values[offset:offset + size].reshape(rows, cols)
+        explist.append(pd.DataFrame(block, index=idx, columns=cols_axis, copy=False))
+        offset += size
+    return explist
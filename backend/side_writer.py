@@ -0,0 +1,92 @@
+import os
+import queue
+import logging
+import threading
+
+import metrics
+
+ORIGIN_SAVE_FORMAT = os.getenv('ORIGIN_SAVE_FORMAT', 'csv')  # csv, pickle, or none to skip the side-output
+SIDE_WRITER_QUEUE_SIZE = int(os.getenv('SIDE_WRITER_QUEUE_SIZE', 64))
+
+FORMATS = {'csv': 'csv', 'pickle': 'pkl'}
+
+_queue = queue.Queue(maxsize=SIDE_WRITER_QUEUE_SIZE)
+_thread = None
+_lock = threading.Lock()
+_status = {'queued': 0, 'written': 0, 'failed': 0, 'bytes_written': 0, 'last_error': None}
+
+
+def extension(fmt):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported side-output format: {fmt}")
+    return FORMATS[fmt]
+
+
+def _write(path, df, fmt):
+    tmp_path = f"{path}.tmp"
+    with metrics.stage(f'side_output_{fmt}', spectra=1) as timing:
+        if fmt == 'csv':
+            df.to_csv(tmp_path)
+        else:
+            df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)  # readers never see a half-written file
+        size = os.path.getsize(path)
+        timing.add(nbytes=size)
+    return size
+
+
+def _run():
+    while True:
+        path, df, fmt = _queue.get()
+        try:
+            size = _write(path, df, fmt)
+            with _lock:
+                _status['written'] += 1
+                _status['bytes_written'] += size
+            logging.debug(f"Side-output written to {path}")
+        except Exception as e:
+            logging.error(f"Failed to write side-output {path}: {str(e)}")
+            with _lock:
+                _status['failed'] += 1
+                _status['last_error'] = f"{path}: {str(e)}"
+        finally:
+            _queue.task_done()
+
+
+def _ensure_thread():
+    global _thread
+    with _lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_run, name='side-writer', daemon=True)
+            _thread.start()
+
+
+def submit(path, df, fmt='csv'):
+    """
+    Queue `df` to be written to `path` in the background.
+
+    The queue is bounded: when the writer falls behind, submit blocks
+    rather than buffering an unbounded number of frames.
+    """
+    extension(fmt)
+    _ensure_thread()
+    with _lock:
+        _status['queued'] += 1
+    _queue.put((path, df, fmt))
+
+
+def flush(timeout=None):
+    """Wait until every queued write has finished. Returns False on timeout."""
+    if timeout is None:
+        _queue.join()
+        return True
+
+    done = threading.Event()
+    threading.Thread(target=lambda: (_queue.join(), done.set()), daemon=True).start()
+    return done.wait(timeout)
+
+
+def status():
+    with _lock:
+        pending = _status['queued'] - _status['written'] - _status['failed']
+        return {'pending': pending, 'max_queue': SIDE_WRITER_QUEUE_SIZE, 'format': ORIGIN_SAVE_FORMAT, **_status}
@@ -0,0 +1,173 @@
+import os
+import time
+import logging
+import threading
+
+import artifacts
+import dataset_store
+import provenance
+import shared_datasets
+from utils import delete_file
+
+STORAGE_MAX_BYTES = int(os.getenv('STORAGE_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+STORAGE_MAX_AGE = float(os.getenv('STORAGE_MAX_AGE', 7 * 24 * 3600))  # seconds
+STORAGE_SESSION_TTL = float(os.getenv('STORAGE_SESSION_TTL', 3600))  # a namespace counts as live this long
+STORAGE_SWEEP_INTERVAL = float(os.getenv('STORAGE_SWEEP_INTERVAL', 600))
+
+SWEEP_LOCK = '.sweep.lock'
+
+_lock = threading.Lock()
+_sweeper = None
+_stop = threading.Event()
+_last_report = None
+_totals = {'sweeps': 0, 'files_deleted': 0, 'bytes_reclaimed': 0}
+
+
+def _scan():
+    """Every artifact file as (path, size, mtime, namespace)."""
+    files = []
+    for kind in artifacts.ARTIFACT_KINDS:
+        root = artifacts.artifact_dir(kind, create=False)
+        if not os.path.isdir(root):
+            continue
+        for directory, _, names in os.walk(root):
+            for name in names:
+                if name == SWEEP_LOCK:
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue  # deleted while scanning
+                files.append((path, stat.st_size, stat.st_mtime, artifacts.namespace_of(path)))
+    return files
+
+
+def _owner(path):
+    """The dataset a file belongs to: itself, or the dataset a sidecar or memory-mapped copy describes."""
+    path = os.path.abspath(path)
+    return provenance.dataset_path_of(path) or shared_datasets.dataset_path_of(path) or path
+
+
+def _remove_empty_namespaces():
+    for kind in artifacts.ARTIFACT_KINDS:
+        root = artifacts.artifact_dir(kind, create=False)
+        if not os.path.isdir(root):
+            continue
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if artifacts.is_namespace(name) and os.path.isdir(path) and not os.listdir(path):
+                try:
+                    os.rmdir(path)
+                except OSError:
+                    pass  # written to since listdir
+
+
+def sweep(max_bytes=None, max_age=None, session_ttl=None):
+    """
+    Delete unreferenced artifacts older than max_age, then the oldest
+    unreferenced ones until the total is within max_bytes.
+
+    Files in namespaces used within session_ttl, and datasets resident in
+    the dataset store, are never deleted. Returns a report of what was
+    reclaimed.
+    """
+    global _last_report
+
+    max_bytes = STORAGE_MAX_BYTES if max_bytes is None else max_bytes
+    max_age = STORAGE_MAX_AGE if max_age is None else max_age
+    session_ttl = STORAGE_SESSION_TTL if session_ttl is None else session_ttl
+
+    with _lock:
+        started = time.time()
+        live = artifacts.live_namespaces(session_ttl)
+        resident = dataset_store.resident_ids()
+
+        files = _scan()
+        total_bytes = sum(size for _, size, _, _ in files)
+        candidates = sorted((mtime, path, size) for path, size, mtime, namespace in files
+                            if namespace not in live and _owner(path) not in resident)
+
+        deleted = 0
+        reclaimed = 0
+        for mtime, path, size in candidates:
+            expired = started - mtime > max_age
+            if not expired and total_bytes - reclaimed <= max_bytes:
+                break  # oldest first, so nothing later has expired either
+            delete_file(path)
+            if not os.path.exists(path):
+                deleted += 1
+                reclaimed += size
+
+        _remove_empty_namespaces()
+
+        remaining = total_bytes - reclaimed
+        if remaining > max_bytes:
+            logging.warning(f"Artifact storage still at {remaining} bytes (quota {max_bytes}); "
+                            f"the rest belongs to live sessions")
+
+        _last_report = {
+            'files_deleted': deleted,
+            'bytes_reclaimed': reclaimed,
+            'bytes_remaining': remaining,
+            'files_protected': len(files) - len(candidates),
+            'live_namespaces': len(live),
+            'duration': time.time() - started,
+            'finished': time.time(),
+        }
+        _totals['sweeps'] += 1
+        _totals['files_deleted'] += deleted
+        _totals['bytes_reclaimed'] += reclaimed
+
+    logging.info(f"Storage sweep reclaimed {reclaimed} bytes from {deleted} files")
+    return dict(_last_report)
+
+
+def _sweep_exclusive():
+    """Sweep unless another server worker is already sweeping the same tree."""
+    try:
+        import fcntl
+    except ImportError:  # not POSIX: single-process serving only
+        return sweep()
+
+    with open(os.path.join(artifacts.artifact_dir(artifacts.SAVED_DATA), SWEEP_LOCK), 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            logging.debug("Storage sweep skipped, another worker is sweeping")
+            return None
+        try:
+            return sweep()
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _run_sweeper(interval):
+    while not _stop.wait(interval):
+        try:
+            _sweep_exclusive()
+        except Exception as e:
+            logging.error(f"Storage sweep failed: {str(e)}")
+
+
+def start_sweeper(interval=None):
+    """Sweep every `interval` seconds on a daemon thread (once per process)."""
+    global _sweeper
+
+    interval = STORAGE_SWEEP_INTERVAL if interval is None else interval
+    if _sweeper is not None and _sweeper.is_alive():
+        return
+    _stop.clear()
+    _sweeper = threading.Thread(target=_run_sweeper, args=(interval,), name='storage-sweeper', daemon=True)
+    _sweeper.start()
+    logging.info(f"Storage sweeper started, interval {interval}s")
+
+
+def stop_sweeper():
+    _stop.set()
+
+
+def stats():
+    with _lock:
+        return {'max_bytes': STORAGE_MAX_BYTES, 'max_age': STORAGE_MAX_AGE, 'session_ttl': STORAGE_SESSION_TTL,
+                'last_sweep': dict(_last_report) if _last_report else None, **_totals}
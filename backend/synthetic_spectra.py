@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def synthetic_spectrum(n_energy=300, n_angle=200, energy_range=(15.0, 25.0), angle_range=(-12.0, 12.0),
+                       elastic_energy=20.0, elastic_width=0.3, peak_angle=0.5, angular_width=2.0,
+                       elastic_amplitude=100.0, loss_peaks=((22.0, 1.0, 5.0),), noise=1.0, background=0.0,
+                       rng=None):
+    """
+    One EELS-like angle-resolved spectrum in this app's layout: index is
+    energy (eV), columns are angles (degree).
+
+    The elastic peak is a 2D Gaussian at (elastic_energy, peak_angle);
+    each (energy, width, amplitude) in loss_peaks adds an angle-independent
+    loss feature. `noise` is the scale of uniform noise on top of
+    `background`.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    energy = np.linspace(*energy_range, n_energy)
+    angle = np.linspace(*angle_range, n_angle)
+
+    de = (energy[:, np.newaxis] - elastic_energy) / elastic_width
+    da = (angle[np.newaxis, :] - peak_angle) / angular_width
+    values = elastic_amplitude * np.exp(-de ** 2 - da ** 2) + background
+    for loss_energy, width, amplitude in loss_peaks:
+        values = values + amplitude * np.exp(-((energy[:, np.newaxis] - loss_energy) / width) ** 2)
+    if noise:
+        values = values + noise * rng.random((n_energy, n_angle))
+
+    return pd.DataFrame(values, index=energy, columns=angle)
+
+
+def synthetic_stack(count=4, drift=0.1, seed=0, **spectrum_kwargs):
+    """
+    (explist, exptitles) of `count` spectra whose elastic peak drifts by
+    `drift` eV per spectrum, like a temperature series. Seeded, so runs
+    are comparable.
+    """
+    rng = np.random.default_rng(seed)
+    elastic_energy = spectrum_kwargs.pop('elastic_energy', 20.0)
+    explist = [synthetic_spectrum(elastic_energy=elastic_energy + drift * k, rng=rng, **spectrum_kwargs)
+               for k in range(count)]
+    exptitles = [f"{k + 1} K" for k in range(count)]
+    return explist, exptitles
+
+
+def write_stack(directory, count=4, fmt='csv', **stack_kwargs):
+    """Write a synthetic stack as files load_and_store_data reads. Returns the file paths."""
+    os.makedirs(directory, exist_ok=True)
+    explist, _ = synthetic_stack(count, **stack_kwargs)
+
+    paths = []
+    for k, df in enumerate(explist, start=1):
+        path = os.path.join(directory, f"sample_{k}.{'pkl' if fmt == 'pickle' else 'csv'}")
+        if fmt == 'pickle':
+            df.to_pickle(path)
+        else:
+            df.to_csv(path)
+        paths.append(path)
+    return paths
@@ -0,0 +1,86 @@
+import hashlib
+import logging
+from io import BytesIO
+
+from PIL import Image
+
+import render_cache
+from plotter import plot_data_with_q_conversion
+from raster import encode_image
+
+TILE_DEFAULTS = {'num_cols': 1, 'show_colorbar': False, 'hide_y_axis_labels': False}
+
+
+def render_tile(df, title, E0=None, **plot_kwargs):
+    """
+    Render one spectrum panel on its own and cache it.
+
+    The cache key covers only this spectrum's content, so editing one
+    spectrum of a large stack re-renders just its tile. Returns the cache key.
+    """
+    kwargs = dict(TILE_DEFAULTS, **plot_kwargs)
+    if E0 is not None:
+        kwargs['gauss_y'] = [E0]
+
+    key, _ = render_cache.cached_render(plot_data_with_q_conversion, [df], [title], **kwargs)
+    return key
+
+
+def _render_tile_args(args):
+    df, title, E0, plot_kwargs = args
+    return render_tile(df, title, E0, **plot_kwargs)
+
+
+def render_tiles(explist, exptitles, gauss_y=None, executor=None, **plot_kwargs):
+    """
+    Render (or fetch from cache) one tile per spectrum and return their keys.
+
+    Pass a concurrent.futures executor to render tiles in parallel.
+    """
+    jobs = [(df, title, gauss_y[i] if gauss_y is not None else None, plot_kwargs)
+            for i, (df, title) in enumerate(zip(explist, exptitles))]
+
+    if executor is None:
+        return [_render_tile_args(job) for job in jobs]
+    return list(executor.map(_render_tile_args, jobs))
+
+
+def compose_tiles(tile_images, num_cols=2, fmt='png'):
+    """Paste encoded tile images into a grid; cells are sized to the largest tile."""
+    tiles = [Image.open(BytesIO(data)).convert('RGB') for data in tile_images]
+    if not tiles:
+        raise ValueError("No tiles to compose")
+
+    cell_width = max(tile.width for tile in tiles)
+    cell_height = max(tile.height for tile in tiles)
+    num_rows = (len(tiles) + num_cols - 1) // num_cols
+
+    canvas = Image.new('RGB', (cell_width * num_cols, cell_height * num_rows), (255, 255, 255))
+    for i, tile in enumerate(tiles):
+        row, col = divmod(i, num_cols)
+        canvas.paste(tile, (col * cell_width, row * cell_height))
+
+    return encode_image(canvas, fmt=fmt)
+
+
+def render_tiled_grid(explist, exptitles, gauss_y=None, num_cols=2, executor=None, **plot_kwargs):
+    """
+    Tiled alternative to plot_data_with_q_conversion: returns (grid key, tile keys).
+
+    The composed grid is cached under a key derived from its tile keys, so it
+    is rebuilt only when a tile changes.
+    """
+    tile_keys = render_tiles(explist, exptitles, gauss_y=gauss_y, executor=executor, **plot_kwargs)
+
+    grid_key = hashlib.blake2b(f"{num_cols}:{','.join(tile_keys)}".encode(), digest_size=20).hexdigest()
+    if render_cache.get(grid_key) is None:
+        tile_images = [render_cache.get(key) for key in tile_keys]
+        for i, data in enumerate(tile_images):
+            if data is None:  # evicted since it was rendered
+                key = render_tile(explist[i], exptitles[i], gauss_y[i] if gauss_y is not None else None, **plot_kwargs)
+                tile_images[i] = render_cache.get(key)
+        grid = compose_tiles(tile_images, num_cols=num_cols)
+        render_cache.put(grid_key, grid.getvalue())
+        logging.debug(f"Composed {len(tile_keys)} tiles into grid {grid_key}")
+
+    return grid_key, tile_keys
@@ -6,6 +6,7 @@ from flask import url_for
 import uuid
 from utils import save_image 
 import logging
+import metrics
 from cv2 import GaussianBlur, filter2D
 
 
@@ -67,6 +68,7 @@ def sharpen(df, sharpen_strength=1.5):
     return sharpened_df
 
 
+@metrics.timed('transform_data')
 def transform_data(explist, action):
     logging.debug(f"Transforming data with action: {action}")
     transformed_explist = []
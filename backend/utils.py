@@ -6,6 +6,8 @@ import logging
 import json
 from io import BytesIO
 
+from artifacts import artifact_dir, IMAGES, SAVED_DATA
+
 
 def save_session_data(session_data, session_filename):
     session_filepath = os.path.join(os.getcwd(), session_filename)
@@ -29,15 +31,10 @@ def load_session_data(session_filename):
         return None
 
 
-def save_image(image_data, filename):
-    # 저장할 디렉토리 경로 설정
-    save_dir = os.path.join(os.getcwd(), 'static', 'images')
+def save_image(image_data, filename, namespace=None):
+    # 저장할 디렉토리 경로 설정 (namespace가 있으면 그 하위 디렉토리)
+    save_dir = artifact_dir(IMAGES, namespace)
     logging.debug(f"Save directory set to: {save_dir}")
-    
-    # 디렉토리가 존재하지 않으면 생성
-    if not os.path.exists(save_dir):
-        os.makedirs(save_dir)
-        logging.debug(f"Created directory: {save_dir}")
 
     # 저장할 파일의 전체 경로 설정
     file_path = os.path.join(save_dir, filename)
@@ -63,14 +60,11 @@ def save_image(image_data, filename):
         logging.debug(f"Exception details: {traceback.format_exc()}")
         return None
 
-    return f'/static/images/{filename}'
+    return f'/static/images/{namespace}/{filename}' if namespace else f'/static/images/{filename}'
 
 
-def save_dataframe_to_file(df_list, filename):
-    save_dir = os.path.join(os.getcwd(), 'saved_data')
-    if not os.path.exists(save_dir):
-        os.makedirs(save_dir)
-        logging.info(f"Created directory: {save_dir}")
+def save_dataframe_to_file(df_list, filename, namespace=None):
+    save_dir = artifact_dir(SAVED_DATA, namespace)
 
     file_path = os.path.join(save_dir, filename)
     try:
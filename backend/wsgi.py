@@ -0,0 +1,17 @@
+"""
+Production entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Workers, timeout and preload are configured in gunicorn.conf.py. SECRET_KEY
+must be set: a generated key would differ between workers and restarts and
+invalidate every session cookie.
+"""
+import os
+
+from app import create_app
+
+if not os.getenv('SECRET_KEY'):
+    raise RuntimeError("SECRET_KEY is not set; set it to a long random value before serving")
+
+app = create_app()
@@ -247,7 +247,10 @@ export function initializeFileUploadHandler() {
             
             if (dataType === 'url') {
                 const baseUrl = 'http://localhost:7654';
-                imageUrl = baseUrl + profileData.image + '?t=' + new Date().getTime();
+                imageUrl = baseUrl + profileData.image;
+                if (!profileData.image.startsWith('/render-cache/')) {
+                    imageUrl += '?t=' + new Date().getTime();
+                }
     
             } else if (dataType === 'base64') {
                 imageUrl = 'data:image/png;base64,' + profileData.image;
@@ -287,8 +290,10 @@ export function initializeFileUploadHandler() {
                 absoluteImageUrl = `http://localhost:7654${imageData}`;
             }
     
-            const timestamp = new Date().getTime();
-            const cacheBustedUrl = `${absoluteImageUrl}?t=${timestamp}`;
+            // /render-cache/ URLs are content-addressed; let the browser revalidate them by ETag
+            const cacheBustedUrl = imageData.startsWith('/render-cache/')
+                ? absoluteImageUrl
+                : `${absoluteImageUrl}?t=${new Date().getTime()}`;
     
             imgElement.onload = () => {
                 imgElement.style.display = 'block';
@@ -368,7 +373,7 @@ export function initializeFileUploadHandler() {
         
             const result = await response.json();
             if (result.success) {
-                updatePreviewImage(result.image, 'bytesio');
+                updatePreviewImage(result.image, 'url');
                 lastUploadedData.explist_q_converted = result.explist_path;
             } else {
                 updateUploadMessage(`Transformation failed: ${result.error}`);
@@ -411,10 +416,12 @@ export function initializeFileUploadHandler() {
             }
     
             // Trigger downloads for each file
-            result.files.forEach(filePath => {
+            result.files.forEach((filePath, index) => {
                 const fileName = filePath.split('/').pop();
                 const downloadLink = document.createElement('a');
-                downloadLink.href = `http://localhost:7654/download/${encodeURIComponent(fileName)}`;
+                downloadLink.href = result.urls
+                    ? `http://localhost:7654${result.urls[index]}`
+                    : `http://localhost:7654/download/${encodeURIComponent(fileName)}`;
                 downloadLink.download = fileName;
                 document.body.appendChild(downloadLink);
                 downloadLink.click();